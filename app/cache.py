@@ -0,0 +1,119 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Any
+from app.config import settings
+
+
+class ResultCache:
+    """
+    In-process LRU cache of detection results keyed on image content.
+    Entries expire after ttl_seconds, total size is kept under max_bytes.
+    Concurrent requests for the same key share one computation.
+    """
+
+    def __init__(self, max_bytes: int = None, ttl_seconds: float = None):
+        self.max_bytes = max_bytes or settings.cache_max_bytes
+        self.ttl = ttl_seconds or settings.cache_ttl_seconds
+        self._entries = OrderedDict()  # key -> (result, size, expires_at)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @staticmethod
+    def make_key(contents: bytes, *params) -> str:
+        """Hash of image bytes plus everything that changes the result"""
+        digest = hashlib.blake2b(contents, digest_size=16).hexdigest()
+        return ":".join([digest] + [str(param) for param in params])
+
+    @staticmethod
+    def estimate_size(result: Dict[str, Any]) -> int:
+        """Rough memory footprint of a result dict"""
+        return 1024 + 256 * (len(result.get('detections') or ()) + len(result.get('persons') or ()))
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return cached result or compute it once for all concurrent callers"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, size, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(result)
+                self._remove(key)
+                self.expired += 1
+
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.merged += 1
+
+        if not owner:
+            return dict(future.result())
+
+        try:
+            result = compute()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._store(key, result)
+        future.set_result(result)
+        return dict(result)
+
+    def _store(self, key: str, result: Dict[str, Any]):
+        size = self.estimate_size(result)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (result, size, time.monotonic() + self.ttl)
+        self.current_bytes += size
+
+        # Evict least recently used entries over the memory limit
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'merged': self.merged,
+                'evictions': self.evictions,
+                'expired': self.expired
+            }
+
+
+result_cache = ResultCache()
@@ -1,12 +1,176 @@
 import os
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     app_name: str = "Safety Monitoring API"
     model_path: str = os.getenv("MODEL_PATH", "weights/best.pt")
+    
+    # Inference engine: torch, onnx or openvino. Exported models default to
+    # ultralytics export names next to model_path (best.onnx, best_openvino_model/)
+    inference_engine: str = "torch"
+    onnx_model_path: str = ""
+    openvino_model_path: str = ""
+    
+    # Named models selectable per request (?model=name or version), e.g.
+    # MODELS='{"candidate": "weights/new.pt"}'; weights loaded at runtime
+    # through /models/{name}/load must be inside model_dir
+    default_model_name: str = "default"
+    models: Dict[str, str] = {}
+    model_dir: str = "weights"
+    
+    # Engine "stub": synthetic boxes with fixed latency, for load tests only;
+    # refused unless allow_stub_engine is set as well
+    allow_stub_engine: bool = False
+    stub_latency_ms: float = 20.0
+    stub_per_image_ms: float = 5.0
+    stub_boxes: int = 12
     confidence_threshold: float = 0.3
+    model_input_size: int = 640
+    
+    # Decode large JPEGs at 1/2, 1/4 or 1/8 while longer side >= model_input_size
+    reduced_decode: bool = True
+    
+    # Tiled inference of large images (drone / panorama): overlapping tiles
+    # plus the whole frame in one batch, boxes merged across tiles.
+    # Per request with ?tiled=true, for all images from tile_min_image_side
+    # with tiling_enabled
+    tiling_enabled: bool = False
+    tile_min_image_side: int = 1920
+    tile_size: int = 640
+    tile_overlap: float = 0.2
+    tile_max: int = 16
+    tile_full_frame: bool = True
+    tile_merge_iou: float = 0.5
+    tile_merge_containment: float = 0.8
     api_version: str = "1.0.0"
     
+    # Micro-batching of concurrent predict requests
+    batch_enabled: bool = True
+    batch_max_size: int = 8
+    batch_max_wait_ms: float = 5.0
+    
+    # Worker pool for decode / inference / drawing, bounded queue
+    worker_threads: int = 8
+    max_queue_size: int = 32
+    retry_after_seconds: int = 1
+    
+    # Multi-process inference: 0 keeps the model in the API process.
+    # worker_threads should be at least 2 * inference_workers to keep them busy
+    inference_workers: int = 0
+    inference_torch_threads: int = 1
+    inference_slot_bytes: int = 1920 * 1080 * 3
+    
+    # Cache of detection results for repeated frames
+    cache_enabled: bool = True
+    cache_max_bytes: int = 64 * 1024 * 1024
+    cache_ttl_seconds: float = 300.0
+    
+    # Per-person PPE association (PPE box share inside person box)
+    person_association: bool = True
+    person_min_overlap: float = 0.5
+    
+    # Warmup inference before the API reports ready
+    warmup_enabled: bool = True
+    warmup_width: int = 1280
+    warmup_height: int = 720
+    warmup_runs: int = 2
+    
+    # Debounced compliance per camera_id: a violation turns on when seen in
+    # temporal_on_frames of the last temporal_window frames of the camera
+    # and off at temporal_off_frames or fewer; only changes become events
+    temporal_window: int = 10
+    temporal_on_frames: int = 6
+    temporal_off_frames: int = 2
+    temporal_max_cameras: int = 10000
+    temporal_event_buffer: int = 10000
+    
+    # Scene-change gate per camera_id: a frame whose gate_width grayscale
+    # thumbnail differs from the last inferred one in under gate_threshold of
+    # pixels (by more than gate_pixel_delta levels) reuses its result;
+    # inference is forced after gate_max_skip_frames or gate_max_age_seconds
+    gate_enabled: bool = True
+    gate_width: int = 64
+    gate_pixel_delta: int = 12
+    gate_threshold: float = 0.01
+    gate_max_skip_frames: int = 30
+    gate_max_age_seconds: float = 5.0
+    gate_max_cameras: int = 10000
+    
+    # Regions of interest per camera_id (normalized polygons, kept in
+    # roi_file): frames are inferred on padded crops of the regions, several
+    # crops when they cover under roi_split_ratio of the union of regions
+    roi_file: str = "data/roi.json"
+    roi_padding: float = 0.1
+    roi_split_ratio: float = 0.7
+    
+    # Overload control: at most every overload_interval_seconds the level
+    # goes one stage down while the worker queue or mean predict latency is
+    # at its high mark, and one up after overload_cooldown_seconds under both
+    # low marks. Level n applies the first n of overload_stages: input_size
+    # (model input overload_input_size), skip_annotation, sample_frames
+    # (every overload_sample_every-th frame of a camera_id, needs gate_enabled).
+    # Leave out input_size for exports with a fixed input shape. Off by
+    # default: degraded responses (smaller input, no image) must be opted into
+    overload_enabled: bool = False
+    overload_stages: List[str] = ["input_size", "skip_annotation", "sample_frames"]
+    overload_interval_seconds: float = 1.0
+    overload_cooldown_seconds: float = 10.0
+    overload_queue_high: int = 16
+    overload_queue_low: int = 2
+    overload_latency_high_ms: float = 500.0
+    overload_latency_low_ms: float = 200.0
+    overload_input_size: int = 480
+    overload_sample_every: int = 2
+    
+    # Detection history: every frame result appended to history_db (SQLite,
+    # WAL) by a background writer, in batches of up to history_batch_size
+    # within history_flush_seconds; frames over history_queue_size are
+    # dropped. Rows older than history_retention_days (0 = keep) are removed.
+    # Off by default; /history queries answer 503 while it is off
+    history_enabled: bool = False
+    history_db: str = "data/history.db"
+    history_queue_size: int = 10000
+    history_batch_size: int = 500
+    history_flush_seconds: float = 1.0
+    history_store_detections: bool = True
+    history_retention_days: float = 30.0
+    
+    # Fast JSON responses: results written without per-item validation,
+    # with orjson if installed. Per request ?fast=true, ?layout=columnar or
+    # Accept: application/msgpack (with msgpack installed) also select it
+    fast_responses: bool = False
+    
+    # Binary annotated image responses (/detect-image), max_width 0 = no limit
+    output_format: str = "jpeg"
+    output_quality: int = 85
+    output_max_width: int = 0
+    max_detections_header_bytes: int = 4096
+    
+    # Annotated images of /detect-and-save: content-addressed files written by
+    # a background thread, least recently used removed over size or age limit
+    storage_dir: str = "static/results"
+    storage_max_bytes: int = 2 * 1024 * 1024 * 1024
+    storage_max_age_seconds: float = 7 * 24 * 3600
+    storage_queue_size: int = 64
+    storage_quality: int = 95
+    
+    # Video analysis jobs: decode thread + sampled frames batched through the
+    # model. Local paths only under video_local_root, uploads go to
+    # video_upload_dir (outside static/, which is served publicly) and are
+    # removed when the job ends
+    video_max_jobs: int = 2
+    video_max_pending_jobs: int = 16
+    video_max_finished_jobs: int = 100
+    video_queue_frames: int = 16
+    video_local_root: str = "videos"
+    video_upload_dir: str = "data/video_uploads"
+    
+    # Per-stage / per-endpoint latency on /metrics (Prometheus text format),
+    # quantiles over the last one to two windows
+    metrics_enabled: bool = True
+    metrics_window_seconds: float = 60.0
+    
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,186 @@
+import os
+import time
+from typing import Dict, List
+import numpy as np
+from app.config import settings
+
+
+class InferenceEngine:
+    """
+    Runs the detector on a list of BGR frames and returns ultralytics-style
+    results (objects with .boxes.cls / .conf / .xyxy), so SafetyMonitor
+    post-processing and class mapping are the same for every engine.
+    """
+
+    name = "base"
+
+    def __init__(self, model_path: str = None):
+        self.model_path = model_path or resolve_model_path(self.name)
+        self.model = None
+        self.timings: Dict[str, float] = {}
+
+    def load(self):
+        raise NotImplementedError
+
+    def __call__(self, images: List[np.ndarray], conf: float, verbose: bool = False, **kwargs):
+        return self.model(images, conf=conf, verbose=verbose, **kwargs)
+
+
+class UltralyticsEngine(InferenceEngine):
+    """Engine backed by ultralytics YOLO, which picks the runtime by file type"""
+
+    def load(self):
+        start_time = time.perf_counter()
+        from ultralytics import YOLO
+        self.timings['import'] = time.perf_counter() - start_time
+
+        if self.name in EXPORT_FORMATS and not os.path.exists(self.model_path):
+            raise FileNotFoundError(
+                f"{self.name} model not found: {self.model_path} "
+                f"(export it with: python -m app.engines {self.name})"
+            )
+
+        start_time = time.perf_counter()
+        self.model = YOLO(self.model_path, task="detect")
+        self.timings['load'] = time.perf_counter() - start_time
+        return self
+
+
+class TorchEngine(UltralyticsEngine):
+    """PyTorch weights (.pt)"""
+    name = "torch"
+
+
+class OnnxEngine(UltralyticsEngine):
+    """ONNX export run by ONNX Runtime (pip install onnxruntime)"""
+    name = "onnx"
+
+
+class OpenVinoEngine(UltralyticsEngine):
+    """OpenVINO IR export directory (pip install openvino)"""
+    name = "openvino"
+
+
+class StubArray:
+    """numpy array with the .cpu().numpy() calls of a torch tensor"""
+
+    def __init__(self, array: np.ndarray):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self) -> np.ndarray:
+        return self.array
+
+
+class StubBoxes:
+    def __init__(self, cls: np.ndarray, conf: np.ndarray, xyxy: np.ndarray):
+        self.cls, self.conf, self.xyxy = StubArray(cls), StubArray(conf), StubArray(xyxy)
+
+    def __len__(self):
+        return len(self.cls.array)
+
+
+class StubResult:
+    def __init__(self, boxes: StubBoxes):
+        self.boxes = boxes
+
+
+class StubEngine(InferenceEngine):
+    """
+    Synthetic detector for load tests, no weights or torch needed. A call
+    sleeps stub_latency_ms + stub_per_image_ms per image (like a model
+    that releases the GIL) and returns about stub_boxes boxes per frame:
+    persons with helmet / vest or no-helmet / no-vest boxes inside.
+    Boxes depend only on frame content, so runs are reproducible.
+    """
+    name = "stub"
+
+    def load(self):
+        self.model = self
+        return self
+
+    def __call__(self, images: List[np.ndarray], conf: float, verbose: bool = False, **kwargs):
+        # Per-image cost grows with input area like a convolutional model
+        scale = (kwargs.get('imgsz') or settings.model_input_size) / settings.model_input_size
+        time.sleep((settings.stub_latency_ms + settings.stub_per_image_ms * scale ** 2 * len(images)) / 1000)
+        return [self._detect(image, conf) for image in images]
+
+    @staticmethod
+    def _detect(image: np.ndarray, conf: float) -> StubResult:
+        height, width = image.shape[:2]
+        seed = int(image[::max(1, height // 16), ::max(1, width // 16)].sum())
+        rng = np.random.default_rng([seed, height, width])
+
+        persons = max(1, settings.stub_boxes // 3)
+        pw = rng.uniform(0.03, 0.08, persons) * width
+        ph = pw * rng.uniform(2.0, 3.0, persons)
+        px = rng.uniform(0, 1, persons) * (width - pw)
+        py = rng.uniform(0, 1, persons) * np.maximum(height - ph, 1)
+
+        # helmet (0) / no-helmet (1) on the head, vest (4) / no-vest (2) on the body
+        head = np.where(rng.random(persons) < 0.8, 0, 1)
+        body = np.where(rng.random(persons) < 0.8, 4, 2)
+        cls = np.concatenate([np.full(persons, 3), head, body])
+        xyxy = np.concatenate([
+            np.stack([px, py, px + pw, py + ph], axis=1),
+            np.stack([px + 0.2 * pw, py, px + 0.8 * pw, py + 0.25 * ph], axis=1),
+            np.stack([px + 0.1 * pw, py + 0.3 * ph, px + 0.9 * pw, py + 0.7 * ph], axis=1),
+        ])[:max(settings.stub_boxes, persons)]
+        cls = cls[:len(xyxy)]
+        confidences = rng.uniform(0.25, 0.95, len(xyxy)).astype(np.float32)
+
+        keep = confidences >= conf
+        return StubResult(StubBoxes(
+            cls[keep].astype(np.float32), confidences[keep], xyxy[keep].astype(np.float32)
+        ))
+
+
+ENGINES = {
+    TorchEngine.name: TorchEngine,
+    OnnxEngine.name: OnnxEngine,
+    OpenVinoEngine.name: OpenVinoEngine,
+    StubEngine.name: StubEngine,
+}
+
+# Format names of YOLO.export() for every engine
+EXPORT_FORMATS = {
+    OnnxEngine.name: "onnx",
+    OpenVinoEngine.name: "openvino",
+}
+
+
+def resolve_model_path(engine: str) -> str:
+    """Model path of engine: explicit setting or ultralytics export name next to .pt"""
+    base = os.path.splitext(settings.model_path)[0]
+    if engine == OnnxEngine.name:
+        return settings.onnx_model_path or f"{base}.onnx"
+    if engine == OpenVinoEngine.name:
+        return settings.openvino_model_path or f"{base}_openvino_model"
+    return settings.model_path
+
+
+def create_engine(engine: str = None, model_path: str = None) -> InferenceEngine:
+    """Create (not yet loaded) engine by name from Settings"""
+    engine = engine or settings.inference_engine
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown inference engine: {engine}, expected one of {list(ENGINES)}")
+    if engine == StubEngine.name and not settings.allow_stub_engine:
+        raise ValueError("Stub engine is for load tests only, set ALLOW_STUB_ENGINE=true to use it")
+    return ENGINES[engine](model_path)
+
+
+def export_model(engine: str) -> str:
+    """Export PyTorch weights for engine, returns path of exported model"""
+    from ultralytics import YOLO
+    model = YOLO(settings.model_path)
+    # dynamic batch axis so that batched predict works on exported models
+    return model.export(format=EXPORT_FORMATS[engine], dynamic=True)
+
+
+if __name__ == "__main__":
+    import sys
+
+    for name in sys.argv[1:] or list(EXPORT_FORMATS):
+        print(f"Exported {name}: {export_model(name)}")
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+from app.config import settings
+
+
+class QueueFullError(Exception):
+    """Raised when the worker pool queue has no free slots"""
+
+
+class BoundedExecutor:
+    """Thread pool with a bounded queue for CPU-bound request stages"""
+
+    def __init__(self, max_workers: int = None, max_queue_size: int = None):
+        self.max_workers = max_workers or settings.worker_threads
+        if max_queue_size is None:
+            max_queue_size = settings.max_queue_size
+        self.max_queue_size = max_queue_size
+        self._pool = None
+        self._pending = 0
+        self._waiting_interactive = 0
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of tasks waiting for a free worker"""
+        return max(0, self._pending - self.max_workers)
+    
+    @property
+    def interactive_queue_depth(self) -> int:
+        """Tasks waiting for a free worker, without run_background ones"""
+        return self._waiting_interactive
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="detection-worker"
+            )
+        return self._pool
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Run fn in the pool without blocking the event loop.
+        Returns fn result and queue stats, raises QueueFullError when full.
+        """
+        return await self._run(fn, args, kwargs, background=False)
+
+    async def run_background(self, fn: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+        """run for bulk work (batch uploads), not counted in interactive_queue_depth"""
+        return await self._run(fn, args, kwargs, background=True)
+
+    async def _run(self, fn: Callable, args, kwargs, background: bool) -> Tuple[Any, Dict[str, Any]]:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue_size:
+                raise QueueFullError("Worker queue is full")
+            self._pending += 1
+            if not background:
+                self._waiting_interactive += 1
+            queue_depth = self.queue_depth
+            pool = self._get_pool()
+
+        submitted = time.perf_counter()
+        stats = {'queue_depth': queue_depth, 'queue_wait_time': 0.0}
+        started = False
+
+        def dequeued():
+            nonlocal started
+            with self._lock:
+                if not started and not background:
+                    self._waiting_interactive -= 1
+                started = True
+
+        def task():
+            stats['queue_wait_time'] = time.perf_counter() - submitted
+            dequeued()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(pool, task)
+        except Exception:
+            dequeued()
+            with self._lock:
+                self._pending -= 1
+            raise
+        result = await future
+        return result, stats
+
+    def shutdown(self):
+        """Stop worker threads"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+executor = BoundedExecutor()
@@ -0,0 +1,403 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.temporal import VIOLATION_TYPES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera_id TEXT NOT NULL,
+    model_version TEXT,
+    is_compliant INTEGER NOT NULL,
+    persons INTEGER NOT NULL,
+    reused INTEGER NOT NULL,
+    safety_status TEXT NOT NULL,
+    detections TEXT
+);
+CREATE INDEX IF NOT EXISTS frames_ts ON frames (ts);
+CREATE INDEX IF NOT EXISTS frames_camera_ts ON frames (camera_id, ts);
+
+CREATE TABLE IF NOT EXISTS frame_violations (
+    type INTEGER NOT NULL,
+    camera_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    frame_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS frame_violations_type ON frame_violations (type, camera_id, ts);
+CREATE INDEX IF NOT EXISTS frame_violations_type_ts ON frame_violations (type, ts);
+"""
+
+# Rollup tables per period: start is unix time // period seconds
+ROLLUPS = {'minutes': 60, 'hours': 3600}
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    camera_id TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    violation_frames INTEGER NOT NULL,
+    persons INTEGER NOT NULL,
+    PRIMARY KEY (camera_id, start)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS {table}_start ON {table} (start, frames, violation_frames, persons);
+
+CREATE TABLE IF NOT EXISTS violation_{table} (
+    type INTEGER NOT NULL,
+    camera_id TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    PRIMARY KEY (type, camera_id, start)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS violation_{table}_start ON violation_{table} (type, start, frames);
+"""
+
+ROLLUP_UPSERT = """
+INSERT INTO {table} (camera_id, start, frames, violation_frames, persons) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (camera_id, start) DO UPDATE SET
+    frames = frames + excluded.frames,
+    violation_frames = violation_frames + excluded.violation_frames,
+    persons = persons + excluded.persons
+"""
+
+VIOLATION_ROLLUP_UPSERT = """
+INSERT INTO violation_{table} (type, camera_id, start, frames) VALUES (?, ?, ?, ?)
+ON CONFLICT (type, camera_id, start) DO UPDATE SET frames = frames + excluded.frames
+"""
+
+SCHEMA += "".join(ROLLUP_SCHEMA.format(table=table) for table in ROLLUPS)
+
+
+class HistoryStore:
+    """
+    Append-only history of per-frame detection results in SQLite (WAL).
+
+    record() only queues the result; a writer thread inserts queued frames
+    in one transaction per batch, so requests never wait for the disk. When
+    the queue is full frames are dropped and counted, history is not worth
+    back-pressure on detection.
+
+    Besides the frame rows every batch updates per-minute and per-hour
+    rollups (per camera, and per camera and violation type). Counts and
+    time buckets are summed from the rollups: full hours of the range from
+    the hourly ones, the rest from the minutes, so a query costs the number
+    of camera-hours in the range, not the number of frames. Their range is
+    widened to whole minutes. Frames without camera_id are stored under
+    camera ''.
+    """
+
+    def __init__(self, path: str = None, queue_size: int = None):
+        self.path = path if path is not None else settings.history_db
+        self._queue = queue.Queue(maxsize=queue_size or settings.history_queue_size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pruned_at = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.pruned = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent with NORMAL, a crash loses the last batches only
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        """Connection of the calling thread, readers do not block the writer in WAL mode"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def start(self):
+        """Create the schema and start the writer thread"""
+        with self._lock:
+            if self._thread is not None or not settings.history_enabled:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = self._connect()
+            connection.executescript(SCHEMA)
+            connection.close()
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Write what is still queued and stop the writer thread"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join()
+        self._thread = None
+
+    def is_running(self) -> bool:
+        """Schema created and writer started, queries can run"""
+        return self._thread is not None
+
+    def record(self, camera_id: Optional[str], result: Dict[str, Any]):
+        """Queue one frame result, never blocks"""
+        if self._thread is None:
+            return
+        # Not the result itself: it may hold the encoded output image
+        item = (
+            time.time(), camera_id or '', result.get('model_version'), bool(result.get('reused')),
+            result['safety_status'], result.get('detections') if settings.history_store_detections else None
+        )
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self):
+        connection = self._connect()
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=settings.history_flush_seconds)
+            except queue.Empty:
+                self._prune(connection)
+                continue
+            batch = []
+            # Collect what arrives within the flush interval, up to a batch
+            deadline = time.monotonic() + settings.history_flush_seconds
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= settings.history_batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            stopping = item is None
+            if batch:
+                self._write(connection, batch)
+            self._prune(connection)
+        connection.close()
+
+    def _write(self, connection: sqlite3.Connection, batch: List):
+        rollups = {table: defaultdict(lambda: [0, 0, 0]) for table in ROLLUPS}
+        violation_rollups = {table: defaultdict(int) for table in ROLLUPS}
+        try:
+            with connection:
+                cursor = connection.cursor()
+                for ts, camera_id, model_version, reused, status, detections in batch:
+                    cursor.execute(
+                        "INSERT INTO frames (ts, camera_id, model_version, is_compliant, persons, "
+                        "reused, safety_status, detections) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            ts, camera_id, model_version, int(status['is_compliant']),
+                            status['persons_count'], int(reused),
+                            json.dumps(status, separators=(',', ':')),
+                            json.dumps(detections, separators=(',', ':')) if detections is not None else None
+                        )
+                    )
+                    frame_id = cursor.lastrowid
+                    violation_types = [
+                        VIOLATION_TYPES.index(violation) for violation in status['violations']
+                        if violation in VIOLATION_TYPES
+                    ]
+                    for violation_type in violation_types:
+                        cursor.execute(
+                            "INSERT INTO frame_violations (type, camera_id, ts, frame_id) VALUES (?, ?, ?, ?)",
+                            (violation_type, camera_id, ts, frame_id)
+                        )
+                    for table, period in ROLLUPS.items():
+                        start = int(ts // period)
+                        totals = rollups[table][camera_id, start]
+                        totals[0] += 1
+                        totals[1] += 1 if status['violations'] else 0
+                        totals[2] += status['persons_count']
+                        for violation_type in violation_types:
+                            violation_rollups[table][violation_type, camera_id, start] += 1
+                for table in ROLLUPS:
+                    cursor.executemany(ROLLUP_UPSERT.format(table=table), [
+                        (*key, *totals) for key, totals in rollups[table].items()
+                    ])
+                    cursor.executemany(VIOLATION_ROLLUP_UPSERT.format(table=table), [
+                        (*key, frames) for key, frames in violation_rollups[table].items()
+                    ])
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+        except sqlite3.Error as e:
+            print(f"Error writing detection history: {e}")
+            with self._lock:
+                self.write_errors += 1
+
+    def _prune(self, connection: sqlite3.Connection):
+        """Remove rows older than history_retention_days, at most once an hour"""
+        now = time.time()
+        if not settings.history_retention_days or now - self._pruned_at < 3600:
+            return
+        self._pruned_at = now
+        cutoff = now - settings.history_retention_days * 86400
+        try:
+            with connection:
+                removed = connection.execute("DELETE FROM frames WHERE ts < ?", (cutoff,)).rowcount
+                connection.execute("DELETE FROM frame_violations WHERE ts < ?", (cutoff,))
+                for table, period in ROLLUPS.items():
+                    connection.execute(f"DELETE FROM {table} WHERE start < ?", (int(cutoff // period),))
+                    connection.execute(f"DELETE FROM violation_{table} WHERE start < ?", (int(cutoff // period),))
+            with self._lock:
+                self.pruned += removed
+        except sqlite3.Error as e:
+            print(f"Error pruning detection history: {e}")
+
+    @staticmethod
+    def _parts(since: float, until: float, hourly: bool = True):
+        """
+        Whole minutes [first, end) of the range and the rollup parts
+        covering them: (table, first start, end start, minutes per row)
+        """
+        first, end = int(since // 60), int(-(-until // 60))
+        first_hour, end_hour = -(-first // 60), end // 60
+        if not hourly or first_hour >= end_hour:
+            return first, end, [('minutes', first, end, 1)]
+        parts = [('hours', first_hour, end_hour, 60)]
+        if first < first_hour * 60:
+            parts.append(('minutes', first, first_hour * 60, 1))
+        if end_hour * 60 < end:
+            parts.append(('minutes', end_hour * 60, end, 1))
+        return first, end, parts
+
+    @staticmethod
+    def _union(parts, columns: str, camera_id: Optional[str], violation_type: Optional[int] = None):
+        """UNION ALL of rollup rows of the parts with their start in minutes, and its arguments"""
+        selects, args = [], []
+        for table, first, end, scale in parts:
+            conditions, part_args = ["start >= ?", "start < ?"], [first, end]
+            if violation_type is not None:
+                table = f"violation_{table}"
+                conditions.insert(0, "type = ?")
+                part_args.insert(0, violation_type)
+            if camera_id is not None:
+                conditions.append("camera_id = ?")
+                part_args.append(camera_id)
+            selects.append(
+                f"SELECT start * {scale} AS minute, {columns} FROM {table} WHERE {' AND '.join(conditions)}"
+            )
+            args += part_args
+        return " UNION ALL ".join(selects), args
+
+    @staticmethod
+    def violation_type(name: str) -> int:
+        """Index of a violation name, ValueError if unknown"""
+        if name not in VIOLATION_TYPES:
+            raise ValueError(f"Unknown violation type, expected one of {list(VIOLATION_TYPES)}")
+        return VIOLATION_TYPES.index(name)
+
+    def counts(self, since: float, until: float, camera_id: str = None) -> Dict[str, Any]:
+        """Frame and violation totals over [since, until), whole minutes"""
+        first, end, parts = self._parts(since, until)
+        connection = self._reader()
+        rows, args = self._union(parts, "frames, violation_frames, persons", camera_id)
+        frames, violation_frames, persons = connection.execute(
+            "SELECT COALESCE(SUM(frames), 0), COALESCE(SUM(violation_frames), 0), "
+            f"COALESCE(SUM(persons), 0) FROM ({rows})", args
+        ).fetchone()
+        violations = {}
+        for violation_type, name in enumerate(VIOLATION_TYPES):
+            rows, args = self._union(parts, "frames", camera_id, violation_type)
+            violations[name] = connection.execute(
+                f"SELECT COALESCE(SUM(frames), 0) FROM ({rows})", args
+            ).fetchone()[0]
+        return {
+            'since': first * 60,
+            'until': end * 60,
+            'camera_id': camera_id,
+            'frames': frames,
+            'violation_frames': violation_frames,
+            'compliance_rate': 1 - violation_frames / frames if frames else None,
+            'persons': persons,
+            'violations': violations
+        }
+
+    def buckets(self, since: float, until: float, bucket_seconds: int,
+                camera_id: str = None, violation: str = None) -> List[Dict[str, Any]]:
+        """Counts per time bucket (a multiple of 60 seconds), empty buckets left out"""
+        bucket_minutes = bucket_seconds // 60
+        # An hourly row falls in one bucket only if buckets are whole hours
+        _, _, parts = self._parts(since, until, hourly=bucket_minutes % 60 == 0)
+        connection = self._reader()
+        if violation is not None:
+            rows, args = self._union(parts, "frames", camera_id, self.violation_type(violation))
+            result = connection.execute(
+                f"SELECT minute / ? AS bucket, SUM(frames) FROM ({rows}) GROUP BY bucket ORDER BY bucket",
+                [bucket_minutes] + args
+            ).fetchall()
+            return [{'start': bucket * bucket_seconds, 'frames': frames} for bucket, frames in result]
+        rows, args = self._union(parts, "frames, violation_frames, persons", camera_id)
+        result = connection.execute(
+            "SELECT minute / ? AS bucket, SUM(frames), SUM(violation_frames), SUM(persons) "
+            f"FROM ({rows}) GROUP BY bucket ORDER BY bucket",
+            [bucket_minutes] + args
+        ).fetchall()
+        return [
+            {'start': bucket * bucket_seconds, 'frames': frames,
+             'violation_frames': violation_frames, 'persons': persons}
+            for bucket, frames, violation_frames, persons in result
+        ]
+
+    def frames(self, since: float, until: float, camera_id: str = None, violation: str = None,
+               limit: int = 100) -> List[Dict[str, Any]]:
+        """Stored frames, newest first; page by passing until = ts of the oldest frame received"""
+        if violation is not None:
+            source = "frame_violations v JOIN frames f ON f.id = v.frame_id"
+            conditions, args = ["v.type = ?"], [self.violation_type(violation)]
+            column = "v"
+        else:
+            source, conditions, args, column = "frames f", [], [], "f"
+        if camera_id is not None:
+            conditions.append(f"{column}.camera_id = ?")
+            args.append(camera_id)
+        conditions += [f"{column}.ts >= ?", f"{column}.ts < ?"]
+        args += [since, until, limit]
+        rows = self._reader().execute(
+            "SELECT f.id, f.ts, f.camera_id, f.model_version, f.reused, f.safety_status, f.detections "
+            f"FROM {source} WHERE {' AND '.join(conditions)} ORDER BY {column}.ts DESC LIMIT ?",
+            args
+        ).fetchall()
+        return [
+            {
+                'id': frame_id,
+                'ts': ts,
+                'camera_id': camera or None,
+                'model_version': model_version,
+                'reused': bool(reused),
+                'safety_status': json.loads(status),
+                'detections': json.loads(detections) if detections is not None else None
+            }
+            for frame_id, ts, camera, model_version, reused, status, detections in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'enabled': settings.history_enabled,
+                'running': self._thread is not None,
+                'queue_size': self._queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'batches': self.batches,
+                'write_errors': self.write_errors,
+                'pruned': self.pruned
+            }
+        if os.path.exists(self.path):
+            stats['db_bytes'] = os.path.getsize(self.path)
+        return stats
+
+
+history_store = HistoryStore()
@@ -1,9 +1,18 @@
 from fastapi import FastAPI
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.routers import detection
 from app.config import settings
 from app.models import safety_monitor
+from app.executor import executor
+from app.history import history_store
+from app.metrics import MetricsMiddleware, metrics
+from app.registry import model_registry
+from app.roi import roi_store
+from app.storage import result_store
+from app.video import video_jobs
+from app.workers import InferencePool
 import uvicorn
 import os
 
@@ -24,6 +33,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Подключаем роутер
 app.include_router(detection.router)
@@ -39,19 +49,42 @@ async def root():
         "message": f"Welcome to {settings.app_name}",
         "version": settings.api_version,
         "docs": "/docs",
-        "health_check": "/api/v1/detection/health"
+        "health_check": "/api/v1/detection/health",
+        "readiness_check": "/api/v1/detection/ready",
+        "metrics": "/metrics"
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Latency quantiles per stage and endpoint, Prometheus text format"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.on_event("startup")
 async def startup_event():
     """Действия при запуске приложения"""
     print(f"Starting {settings.app_name} v{settings.api_version}")
     print(f"Model path: {settings.model_path}")
-    # Проверяем загрузку модели
-    if safety_monitor.is_model_loaded():
-        print(" Model loaded successfully")
+    # Модель загружается в фоне, готовность - /api/v1/detection/ready
+    if settings.inference_workers > 0:
+        safety_monitor.pool = InferencePool()
+        safety_monitor.pool.start()
     else:
-        print(" Model failed to load")
+        safety_monitor.start_background_load()
+    print(" Model loading in background")
+    model_registry.start()
+    result_store.start()
+    history_store.start()
+    roi_store.load()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Действия при остановке приложения"""
+    video_jobs.shutdown()
+    executor.shutdown()
+    result_store.stop()
+    history_store.stop()
+    if safety_monitor.pool is not None:
+        safety_monitor.pool.stop()
 
 if __name__ == "__main__":
     print(" tarting server on http://localhost:8000")
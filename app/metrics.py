@@ -0,0 +1,248 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Tuple
+from app.config import settings
+
+# Latency buckets 15% apart from 50 us to 2 min, quantiles are exact to one bucket
+LATENCY_BOUNDS = [5e-5 * 1.15 ** i for i in range(int(math.log(120 / 5e-5, 1.15)) + 2)]
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Image size histogram buckets
+IMAGE_BYTES_BOUNDS = [16 * 1024 * 2 ** i for i in range(12)]  # 16 KB .. 32 MB
+IMAGE_PIXELS_BOUNDS = [0.3e6, 0.5e6, 1e6, 2.1e6, 3.7e6, 8.3e6, 12e6, 20e6, 33e6]
+
+
+class LatencySummary:
+    """
+    Fixed log-bucket latency counts. Quantiles cover the last one to two
+    windows (current + previous), sum and count are totals since start
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window = window_seconds
+        self.current = [0] * (len(LATENCY_BOUNDS) + 1)
+        self.previous = [0] * (len(LATENCY_BOUNDS) + 1)
+        self.window_started = time.monotonic()
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float, now: float):
+        if now - self.window_started > self.window:
+            # Skipped more than one window: previous one is empty too
+            stale = now - self.window_started > 2 * self.window
+            self.previous = [0] * len(self.current) if stale else self.current
+            self.current = [0] * len(self.previous)
+            self.window_started = now
+        self.current[bisect.bisect_left(LATENCY_BOUNDS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantiles(self, now: float) -> List[Tuple[float, float]]:
+        if now - self.window_started > 2 * self.window:
+            return [(q, math.nan) for q in QUANTILES]
+        if now - self.window_started > self.window:
+            counts = self.current
+        else:
+            counts = [a + b for a, b in zip(self.current, self.previous)]
+        observed = sum(counts)
+        if observed == 0:
+            return [(q, math.nan) for q in QUANTILES]
+
+        result = []
+        for q in QUANTILES:
+            rank, seen = q * observed, 0
+            for i, count in enumerate(counts):
+                seen += count
+                if seen >= rank:
+                    break
+            # Upper bound of the bucket, last bucket is open
+            result.append((q, LATENCY_BOUNDS[min(i, len(LATENCY_BOUNDS) - 1)]))
+        return result
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram"""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    In-process request metrics rendered in Prometheus text format:
+    per-stage and per-endpoint latency quantiles, requests in flight and
+    uploaded image size. An observation is a bisect and a few increments
+    under one lock.
+
+    Stages timed in inference worker processes (inference_workers > 0)
+    stay in those processes; the 'predict' stage measured in the API
+    process covers them together with batching wait.
+    """
+
+    def __init__(self, window_seconds: float = None):
+        self.window = window_seconds or settings.metrics_window_seconds
+        self.stages: Dict[str, LatencySummary] = {}
+        self.endpoints: Dict[str, LatencySummary] = {}
+        self.in_flight = 0
+        self.image_bytes = Histogram(IMAGE_BYTES_BOUNDS)
+        self.image_pixels = Histogram(IMAGE_PIXELS_BOUNDS)
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage: str, seconds: float):
+        if not settings.metrics_enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            summary = self.stages.get(stage)
+            if summary is None:
+                summary = self.stages[stage] = LatencySummary(self.window)
+            summary.observe(seconds, now)
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Time the with-block as one stage"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start_time)
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, endpoint: str, seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            summary = self.endpoints.get(endpoint)
+            if summary is None:
+                summary = self.endpoints[endpoint] = LatencySummary(self.window)
+            summary.observe(seconds, now)
+
+    def observe_image(self, size_bytes: int = None, width: int = None, height: int = None):
+        if not settings.metrics_enabled:
+            return
+        with self._lock:
+            if size_bytes is not None:
+                self.image_bytes.observe(size_bytes)
+            if width is not None and height is not None:
+                self.image_pixels.observe(width * height)
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        now = time.monotonic()
+        lines = []
+        with self._lock:
+            self._render_summaries(
+                lines, 'safety_stage_seconds', 'stage', self.stages, now,
+                'Duration of request processing stages'
+            )
+            self._render_summaries(
+                lines, 'safety_request_seconds', 'endpoint', self.endpoints, now,
+                'Duration of HTTP requests until the last body chunk'
+            )
+            lines.append('# HELP safety_requests_in_flight HTTP requests being processed')
+            lines.append('# TYPE safety_requests_in_flight gauge')
+            lines.append(f'safety_requests_in_flight {self.in_flight}')
+            self._render_histogram(
+                lines, 'safety_image_bytes', self.image_bytes, 'Size of uploaded images in bytes'
+            )
+            self._render_histogram(
+                lines, 'safety_image_pixels', self.image_pixels, 'Pixels of decoded images (original size)'
+            )
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_summaries(lines, name, label, summaries, now, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} summary')
+        for key, summary in sorted(summaries.items()):
+            for q, value in summary.quantiles(now):
+                # No observations in the window
+                text = 'NaN' if math.isnan(value) else f'{value:.6g}'
+                lines.append(f'{name}{{{label}="{key}",quantile="{q}"}} {text}')
+            lines.append(f'{name}_sum{{{label}="{key}"}} {summary.total:.6f}')
+            lines.append(f'{name}_count{{{label}="{key}"}} {summary.count}')
+
+    @staticmethod
+    def _render_histogram(lines, name, histogram, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        cumulative = 0
+        for bound, count in zip(histogram.bounds, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum {histogram.total:g}')
+        lines.append(f'{name}_count {histogram.count}')
+
+
+class MetricsMiddleware:
+    """ASGI middleware: requests in flight and latency per route of HTTP requests"""
+
+    def __init__(self, app, registry: Metrics = None):
+        self.app = app
+        self.metrics = registry if registry is not None else metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not settings.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        self.metrics.request_started()
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if not finished:
+                finished = True
+                # Routing has filled in the scope by now
+                self.metrics.request_finished(self._endpoint(scope), time.perf_counter() - start_time)
+
+        async def send_wrapper(message):
+            await send(message)
+            # Streaming responses end with the last body chunk
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+
+    @staticmethod
+    def _endpoint(scope) -> str:
+        """Route path template, so that path parameters do not split series"""
+        path = getattr(scope.get('route'), 'path', None)
+        if path is None:
+            # Starlette versions without scope['route']
+            path = getattr(scope.get('endpoint'), '__name__', None)
+        return path or 'unmatched'
+
+
+def timed(stage: str):
+    """Decorator: record every call of the function as stage"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metrics.stage(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+metrics = Metrics()
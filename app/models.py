@@ -1,119 +1,429 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
+import os
 import time
+import queue
+import threading
+from concurrent.futures import Future
 from typing import List, Dict, Any
+from app.association import associate_ppe
 from app.config import settings
+from app.engines import create_engine, resolve_model_path
+from app.metrics import metrics
+from app.tiling import merge_tile_detections, tile_grid
+
+
+class BatchScheduler:
+    """Collects concurrent predict requests into batched model calls"""
+    
+    def __init__(self, monitor, max_batch_size: int = None, max_wait_ms: float = None):
+        self.monitor = monitor
+        self.max_batch_size = max_batch_size or settings.batch_max_size
+        if max_wait_ms is None:
+            max_wait_ms = settings.batch_max_wait_ms
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """Start the batching thread if it is not running yet"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="batch-scheduler", daemon=True
+                )
+                self._thread.start()
+    
+    def submit(self, image: np.ndarray, confidence_threshold: float,
+               with_detections: bool = True, imgsz: int = None) -> Future:
+        """Queue image for the next batch, returns Future with predict() result"""
+        self.start()
+        future = Future()
+        self._queue.put((image, (confidence_threshold, with_detections, imgsz), future))
+        return future
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            
+            # Wait for more requests until batch is full or time is up
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            
+            self._process(batch)
+    
+    def _process(self, batch):
+        # One model call accepts one threshold and input size, so group requests by them
+        groups = {}
+        for image, options, future in batch:
+            if future.set_running_or_notify_cancel():
+                groups.setdefault(options, []).append((image, future))
+        
+        for (confidence_threshold, with_detections, imgsz), items in groups.items():
+            try:
+                results = self.monitor.predict_batch(
+                    [image for image, _ in items], confidence_threshold, with_detections, imgsz
+                )
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
 
 
 class SafetyMonitor:
-    def __init__(self):
-        self.model = None
+    def __init__(self, load: bool = True, model_path: str = None):
         self.classes = ['helmet', 'no-helmet', 'no-vest', 'person', 'vest']
-        self.load_model()
+        self.class_index = {name: i for i, name in enumerate(self.classes)}
+        self.scheduler = BatchScheduler(self)
+        self.pool = None
+        self.engine_name = settings.inference_engine
+        self.model_path = model_path or resolve_model_path(self.engine_name)
+        # Model and its version are replaced together by one assignment,
+        # a batch reads both once and finishes on the model it started with
+        self._active = (None, self.get_model_version(self.model_path))
+        self.previous_version = None
+        self.timings = {}
+        self.load_error = None
+        self._load_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        # The YOLO predictor is not thread-safe: one model call at a time
+        # (without batching every executor thread would call it directly)
+        self._predict_lock = threading.Lock()
+        self._ready = threading.Event()
+        if load:
+            self.load_model()
+    
+    @property
+    def model(self):
+        return self._active[0]
+    
+    @model.setter
+    def model(self, model):
+        self._active = (model, self._active[1])
+    
+    @property
+    def model_version(self) -> str:
+        return self._active[1]
     
     def load_model(self):
         """Load YOLO model"""
         try:
-            print(f"Loading model from: {settings.model_path}")
-            self.model = YOLO(settings.model_path)
+            engine = create_engine(self.engine_name, self.model_path)
+            print(f"Loading {engine.name} model from: {engine.model_path}")
+            # Heavy imports (torch, runtimes) are done here, not when app is imported
+            self.model = engine.load()
+            self.timings.update(engine.timings)
+            self.load_error = None
             print("Model loaded successfully")
             return True
         except Exception as e:
+            self.load_error = str(e)
             print(f"Error loading model: {e}")
             return False
     
+    def ensure_loaded(self):
+        """Load model on first use if it was not loaded yet"""
+        with self._load_lock:
+            if self.model is None:
+                self.load_model()
+        return self.model is not None
+    
+    def warmup(self):
+        """Dummy inference of expected frame size, marks model as ready"""
+        if not self.ensure_loaded():
+            return False
+        
+        if settings.warmup_enabled:
+            self.timings['warmup'] = self._warmup_model(self.model)
+            print(f"Model warmed up in {self.timings['warmup']:.2f}s")
+        
+        self._ready.set()
+        return True
+    
+    @staticmethod
+    def _warmup_model(model) -> float:
+        """Dummy inferences of expected frame size, returns their duration"""
+        frame = np.zeros((settings.warmup_height, settings.warmup_width, 3), dtype=np.uint8)
+        start_time = time.perf_counter()
+        for _ in range(settings.warmup_runs):
+            model([frame], conf=settings.confidence_threshold, verbose=False)
+        return time.perf_counter() - start_time
+    
+    def reload(self, model_path: str = None):
+        """
+        Load new weights next to the serving model, warm them up and swap
+        them in. Requests keep running on the old model meanwhile; on error
+        the old model stays and the exception is raised
+        """
+        if self.pool is not None:
+            raise RuntimeError("Reload is not supported with inference_workers > 0")
+        with self._reload_lock:
+            engine = create_engine(self.engine_name, model_path or self.model_path)
+            print(f"Reloading {engine.name} model from: {engine.model_path}")
+            model = engine.load()
+            timings = dict(engine.timings)
+            if settings.warmup_enabled:
+                timings['warmup'] = self._warmup_model(model)
+            
+            previous_version = self.model_version
+            self._active = (model, self.get_model_version(engine.model_path))
+            self.model_path = engine.model_path
+            self.previous_version = previous_version
+            self.timings.update(timings)
+            self.load_error = None
+            self._ready.set()
+            print(f"Model swapped: {previous_version} -> {self.model_version}")
+            return self.model_version
+    
+    def start_background_load(self):
+        """Load and warm up model without blocking startup"""
+        thread = threading.Thread(target=self.warmup, name="model-loader", daemon=True)
+        thread.start()
+        return thread
+    
+    @staticmethod
+    def get_model_version(model_path: str) -> str:
+        """Model file name and modification time"""
+        name = os.path.basename(model_path)
+        try:
+            return f"{name}@{int(os.path.getmtime(model_path))}"
+        except OSError:
+            return name
+    
     def check_safety_compliance(self, detections: List[Dict], confidence_threshold: float = None):
         """Check safety compliance"""
+        class_ids = np.array(
+            [self.class_index.get(det['class_name'], -1) for det in detections], dtype=np.int64
+        )
+        confidences = np.array([det['confidence'] for det in detections], dtype=np.float64)
+        return self.compliance_from_arrays(class_ids, confidences, confidence_threshold)
+    
+    def compliance_from_arrays(self, class_ids: np.ndarray, confidences: np.ndarray,
+                               confidence_threshold: float = None):
+        """Check safety compliance from class id / confidence arrays"""
         if confidence_threshold is None:
             confidence_threshold = settings.confidence_threshold
         
-        safety_status = {
-            'person_detected': False,
-            'has_helmet': False,
-            'has_vest': False,
-            'is_compliant': False,
-            'violations': [],
-            'persons_count': 0,
-            'helmets_count': 0,
-            'vests_count': 0,
-            'no_helmets_count': 0,
-            'no_vests_count': 0
-        }
+        # Count confident detections per class, compare in float64 as
+        # the per-detection Python floats used to be
+        keep = (confidences.astype(np.float64) >= confidence_threshold) & (class_ids >= 0)
+        counts = np.bincount(class_ids[keep], minlength=len(self.classes)).tolist()
         
-        # Process detections
-        for det in detections:
-            class_name = det['class_name']
-            confidence = det['confidence']
-            
-            if confidence < confidence_threshold:
-                continue
-                
-            if class_name == 'person':
-                safety_status['person_detected'] = True
-                safety_status['persons_count'] += 1
-            elif class_name == 'helmet':
-                safety_status['has_helmet'] = True
-                safety_status['helmets_count'] += 1
-            elif class_name == 'vest':
-                safety_status['has_vest'] = True
-                safety_status['vests_count'] += 1
-            elif class_name == 'no-helmet':
-                safety_status['no_helmets_count'] += 1
-            elif class_name == 'no-vest':
-                safety_status['no_vests_count'] += 1
+        persons_count = counts[self.class_index['person']]
+        helmets_count = counts[self.class_index['helmet']]
+        vests_count = counts[self.class_index['vest']]
+        no_helmets_count = counts[self.class_index['no-helmet']]
+        no_vests_count = counts[self.class_index['no-vest']]
+        
+        person_detected = persons_count > 0
+        has_helmet = helmets_count > 0
+        has_vest = vests_count > 0
         
         # Check violations
-        if safety_status['person_detected']:
-            if safety_status['no_helmets_count'] > 0 or not safety_status['has_helmet']:
-                safety_status['violations'].append('No helmet')
-            if safety_status['no_vests_count'] > 0 or not safety_status['has_vest']:
-                safety_status['violations'].append('No vest')
+        violations = []
+        if person_detected:
+            if no_helmets_count > 0 or not has_helmet:
+                violations.append('No helmet')
+            if no_vests_count > 0 or not has_vest:
+                violations.append('No vest')
         
         # Check compliance
-        if safety_status['person_detected']:
-            safety_status['is_compliant'] = (
-                safety_status['has_helmet'] and
-                safety_status['has_vest'] and
-                len(safety_status['violations']) == 0
-            )
+        is_compliant = person_detected and has_helmet and has_vest and len(violations) == 0
         
-        return safety_status
+        return {
+            'person_detected': person_detected,
+            'has_helmet': has_helmet,
+            'has_vest': has_vest,
+            'is_compliant': is_compliant,
+            'violations': violations,
+            'persons_count': persons_count,
+            'helmets_count': helmets_count,
+            'vests_count': vests_count,
+            'no_helmets_count': no_helmets_count,
+            'no_vests_count': no_vests_count
+        }
     
-    def predict(self, image: np.ndarray, confidence_threshold: float = None):
+    def predict(self, image: np.ndarray, confidence_threshold: float = None,
+                with_detections: bool = True):
         """Perform detection on image"""
+        return self.predict_batch([image], confidence_threshold, with_detections)[0]
+    
+    def predict_batch(self, images: List[np.ndarray], confidence_threshold: float = None,
+                      with_detections: bool = True, imgsz: int = None):
+        """
+        Perform detection on several images with one model call.
+        With with_detections=False only safety_status is built, 'detections' is None.
+        imgsz: model input size of this call, model default if None
+        """
         if confidence_threshold is None:
             confidence_threshold = settings.confidence_threshold
         
-        start_time = time.time()
+        if self.model is None and not self.ensure_loaded():
+            raise RuntimeError(f"Model not loaded: {self.load_error}")
+        model, model_version = self._active
         
         # Perform prediction
-        results = self.model(image, conf=confidence_threshold, verbose=False)
-        
-        detections = []
-        if results and len(results) > 0:
-            boxes = results[0].boxes
-            if boxes is not None and len(boxes) > 0:
-                for i in range(len(boxes)):
-                    class_id = int(boxes.cls[i].item())
-                    confidence = boxes.conf[i].item()
-                    bbox = boxes.xyxy[i].cpu().numpy().tolist()
-                    
-                    detections.append({
-                        'class_id': class_id,
-                        'class_name': self.classes[class_id],
-                        'confidence': float(confidence),
-                        'bbox': bbox
-                    })
+        options = {'imgsz': imgsz} if imgsz else {}
+        with self._predict_lock:
+            start_time = time.time()
+            results = model(images, conf=confidence_threshold, verbose=False, **options)
+            inference_time = time.time() - start_time
+        metrics.observe_stage('inference', inference_time)
+        
+        with metrics.stage('postprocess'):
+            results = [
+                self._build_result(image, result, inference_time, confidence_threshold, with_detections)
+                for image, result in zip(images, results)
+            ]
+        for result in results:
+            result['model_version'] = model_version
+        return results
+    
+    def submit(self, image: np.ndarray, confidence_threshold: float = None,
+               with_detections: bool = True, imgsz: int = None) -> Future:
+        """Schedule detection, concurrent requests are batched together"""
+        if confidence_threshold is None:
+            confidence_threshold = settings.confidence_threshold
+        
+        if self.pool is not None:
+            return self.pool.submit(image, confidence_threshold, with_detections, imgsz)
+        
+        if settings.batch_enabled:
+            return self.scheduler.submit(image, confidence_threshold, with_detections, imgsz)
         
+        future = Future()
+        try:
+            future.set_result(self.predict_batch([image], confidence_threshold, with_detections, imgsz)[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def predict_tiled(self, image: np.ndarray, confidence_threshold: float = None,
+                      with_detections: bool = True, imgsz: int = None):
+        """
+        Detection on overlapping tiles of a large image, so that small distant
+        workers are seen at full resolution. Tiles (and the whole frame) are
+        submitted together to share a batch, boxes are merged across tiles and
+        compliance is computed on the merged set. imgsz as in submit.
+        """
+        if confidence_threshold is None:
+            confidence_threshold = settings.confidence_threshold
+        
+        height, width = image.shape[:2]
+        tiles = tile_grid(width, height, settings.tile_size, settings.tile_overlap, settings.tile_max)
+        if settings.tile_full_frame:
+            # Large objects that do not fit into one tile
+            tiles.append((0, 0, width, height))
+        
+        class_ids, confidences, xyxy, inference_time, model_version = self._predict_crops(
+            image, tiles, confidence_threshold, imgsz
+        )
+        result = self._result_from_arrays(
+            image, class_ids, confidences, xyxy, inference_time,
+            confidence_threshold, with_detections
+        )
+        result['tiles'] = len(tiles)
+        result['model_version'] = model_version
+        return result
+    
+    def predict_roi(self, image: np.ndarray, crops, keep_fn, confidence_threshold: float = None,
+                    with_detections: bool = True, imgsz: int = None):
+        """
+        Detection on crops of the regions of interest only. Boxes are mapped
+        back to frame coordinates, keep_fn(xyxy) -> bool mask drops boxes
+        outside the regions before compliance is computed. imgsz as in submit
+        """
+        if confidence_threshold is None:
+            confidence_threshold = settings.confidence_threshold
+        
+        class_ids, confidences, xyxy, inference_time, model_version = self._predict_crops(
+            image, crops, confidence_threshold, imgsz
+        )
+        keep = keep_fn(xyxy)
+        result = self._result_from_arrays(
+            image, class_ids[keep], confidences[keep], xyxy[keep], inference_time,
+            confidence_threshold, with_detections
+        )
+        result['model_version'] = model_version
+        return result
+    
+    def _predict_crops(self, image: np.ndarray, crops, confidence_threshold: float, imgsz: int = None):
+        """
+        Submit (x1, y1, x2, y2) crops together to share a batch, returns boxes
+        in frame coordinates merged across overlapping crops
+        """
+        start_time = time.time()
+        futures = [
+            self.submit(np.ascontiguousarray(image[y1:y2, x1:x2]), confidence_threshold, imgsz=imgsz)
+            for x1, y1, x2, y2 in crops
+        ]
+        
+        class_ids, confidences, boxes, crop_ids = [], [], [], []
+        model_version = None
+        for crop_id, ((x1, y1, _, _), future) in enumerate(zip(crops, futures)):
+            crop_result = future.result()
+            model_version = crop_result.get('model_version')
+            for det in crop_result['detections']:
+                class_ids.append(det['class_id'])
+                confidences.append(det['confidence'])
+                bx1, by1, bx2, by2 = det['bbox']
+                boxes.append((bx1 + x1, by1 + y1, bx2 + x1, by2 + y1))
+                crop_ids.append(crop_id)
         inference_time = time.time() - start_time
         
+        class_ids = np.array(class_ids, dtype=np.int64)
+        confidences = np.array(confidences, dtype=np.float32)
+        xyxy = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+        if len(crops) > 1:
+            with metrics.stage('tile_merge'):
+                class_ids, confidences, xyxy = merge_tile_detections(
+                    class_ids, confidences, xyxy,
+                    np.array(crop_ids, dtype=np.int64),
+                    settings.tile_merge_iou,
+                    settings.tile_merge_containment
+                )
+        return class_ids, confidences, xyxy, inference_time, model_version
+    
+    def _build_result(self, image: np.ndarray, result, inference_time: float,
+                      confidence_threshold: float, with_detections: bool = True):
+        """Convert one YOLO result to response dict"""
+        class_ids, confidences, xyxy = self._boxes_to_arrays(result.boxes)
+        return self._result_from_arrays(
+            image, class_ids, confidences, xyxy, inference_time,
+            confidence_threshold, with_detections
+        )
+    
+    def _result_from_arrays(self, image: np.ndarray, class_ids: np.ndarray, confidences: np.ndarray,
+                            xyxy: np.ndarray, inference_time: float,
+                            confidence_threshold: float, with_detections: bool = True):
+        """Response dict from detection arrays"""
         # Safety check
-        safety_status = self.check_safety_compliance(detections, confidence_threshold)
+        with metrics.stage('compliance'):
+            safety_status = self.compliance_from_arrays(class_ids, confidences, confidence_threshold)
+        
+        persons = None
+        if with_detections and settings.person_association:
+            with metrics.stage('association'):
+                persons = associate_ppe(
+                    class_ids, confidences, xyxy, self.class_index,
+                    confidence_threshold, settings.person_min_overlap
+                )
         
         return {
-            'detections': detections,
+            'detections': self.detections_to_dicts(class_ids, confidences, xyxy) if with_detections else None,
             'safety_status': safety_status,
+            'persons': persons,
             'inference_time': inference_time,
             'frame_size': {
                 'height': image.shape[0],
@@ -122,9 +432,56 @@ class SafetyMonitor:
             }
         }
     
+    @staticmethod
+    def _boxes_to_arrays(boxes):
+        """Move cls, conf and xyxy to numpy with one transfer each"""
+        if boxes is None or len(boxes) == 0:
+            return (
+                np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype=np.float32),
+                np.zeros((0, 4), dtype=np.float32)
+            )
+        return (
+            boxes.cls.cpu().numpy().astype(np.int64),
+            boxes.conf.cpu().numpy(),
+            boxes.xyxy.cpu().numpy()
+        )
+    
+    def detections_to_dicts(self, class_ids: np.ndarray, confidences: np.ndarray,
+                            xyxy: np.ndarray) -> List[Dict]:
+        """Build response dicts from detection arrays"""
+        classes = self.classes
+        return [
+            {
+                'class_id': class_id,
+                'class_name': classes[class_id],
+                'confidence': confidence,
+                'bbox': bbox
+            }
+            for class_id, confidence, bbox in zip(
+                class_ids.tolist(), confidences.tolist(), xyxy.tolist()
+            )
+        ]
+    
     def is_model_loaded(self):
         """Check if model is loaded"""
+        if self.pool is not None:
+            return self.pool.is_running()
         return self.model is not None
+    
+    def is_ready(self):
+        """Model loaded and warmed up, requests can be served"""
+        if self.pool is not None:
+            return self.pool.is_ready()
+        return self._ready.is_set()
+    
+    def get_timings(self):
+        """Import / load / warmup timings in seconds"""
+        if self.pool is not None:
+            return {'workers': self.pool.worker_timings}
+        return dict(self.timings)
 
 
-safety_monitor = SafetyMonitor()
+# Model is loaded on startup in background (or in inference workers),
+# not as a side effect of import
+safety_monitor = SafetyMonitor(load=False)
@@ -0,0 +1,139 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.executor import executor
+
+STAGES = ('input_size', 'skip_annotation', 'sample_frames')
+
+
+class OverloadController:
+    """
+    Graceful degradation under load. Level n applies the first n stages of
+    overload_stages; the level is re-evaluated at most every
+    overload_interval_seconds and moves one stage at a time: down while the
+    worker queue or mean predict latency is at its high mark, back up after
+    overload_cooldown_seconds below both low marks. The queue signal counts
+    interactive requests only, a long /detect-batch upload waiting for
+    workers does not degrade other clients.
+
+    Stages:
+    - input_size: model input of overload_input_size instead of the default
+    - skip_annotation: no boxes drawn, JSON endpoints return no image
+    - sample_frames: every overload_sample_every-th frame of a camera_id is
+      inferred, the others reuse its last result (needs the scene gate)
+    """
+
+    def __init__(self, stages: List[str] = None):
+        stages = stages if stages is not None else settings.overload_stages
+        unknown = [stage for stage in stages if stage not in STAGES]
+        if unknown:
+            raise ValueError(f"Unknown overload stages: {unknown}")
+        self.stages = list(stages)
+        self.level = 0
+        self.changes = 0
+        self.level_seconds = [0.0] * (len(self.stages) + 1)
+        self._evaluated_at = time.monotonic()
+        self._calm_since: Optional[float] = None
+        self._max_queue = 0
+        self._predict_seconds = 0.0
+        self._predictions = 0
+        self._last_signals = {'queue_depth': 0, 'predict_ms': None}
+        self._camera_frames: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, predict_seconds: float):
+        """Predict time of one inferred frame"""
+        with self._lock:
+            self._predict_seconds += predict_seconds
+            self._predictions += 1
+
+    def current(self) -> int:
+        """Level to apply to a new request"""
+        if not settings.overload_enabled:
+            return 0
+        queue_depth = executor.interactive_queue_depth
+        now = time.monotonic()
+        with self._lock:
+            self._max_queue = max(self._max_queue, queue_depth)
+            if now - self._evaluated_at >= settings.overload_interval_seconds:
+                self._evaluate(now)
+            return self.level
+
+    def _evaluate(self, now: float):
+        predict_ms = (
+            self._predict_seconds / self._predictions * 1000 if self._predictions else None
+        )
+        overloaded = (
+            self._max_queue >= settings.overload_queue_high
+            or (predict_ms is not None and predict_ms >= settings.overload_latency_high_ms)
+        )
+        calm = (
+            self._max_queue <= settings.overload_queue_low
+            and (predict_ms is None or predict_ms <= settings.overload_latency_low_ms)
+        )
+        self.level_seconds[self.level] += now - self._evaluated_at
+        level = self.level
+        if overloaded:
+            self._calm_since = None
+            level = min(self.level + 1, len(self.stages))
+        elif not calm:
+            self._calm_since = None
+        else:
+            # Signals cover the whole interval, an idle gap counts as calm
+            if self._calm_since is None:
+                self._calm_since = self._evaluated_at
+            if now - self._calm_since >= settings.overload_cooldown_seconds:
+                self._calm_since = now
+                level = max(self.level - 1, 0)
+        if level != self.level:
+            print(f"Overload level {self.level} -> {level} "
+                  f"(queue {self._max_queue}, predict {predict_ms or 0:.0f} ms)")
+            self.level = level
+            self.changes += 1
+            if 'sample_frames' not in self.stages[:level]:
+                self._camera_frames.clear()
+        self._last_signals = {'queue_depth': self._max_queue, 'predict_ms': predict_ms}
+        self._evaluated_at = now
+        self._max_queue = 0
+        self._predict_seconds = 0.0
+        self._predictions = 0
+
+    def applied(self, level: int) -> List[str]:
+        return self.stages[:level]
+
+    def input_size(self, level: int) -> Optional[int]:
+        """Model input size at level, None for the model default"""
+        return settings.overload_input_size if 'input_size' in self.stages[:level] else None
+
+    def annotate(self, level: int) -> bool:
+        return 'skip_annotation' not in self.stages[:level]
+
+    def skip_frame(self, camera_id: Optional[str], level: int) -> bool:
+        """True for camera frames between the sampled ones"""
+        if camera_id is None or 'sample_frames' not in self.stages[:level]:
+            return False
+        with self._lock:
+            if len(self._camera_frames) >= settings.gate_max_cameras and camera_id not in self._camera_frames:
+                self._camera_frames.clear()
+            frame = self._camera_frames.get(camera_id, -1) + 1
+            self._camera_frames[camera_id] = frame
+        return frame % settings.overload_sample_every != 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': settings.overload_enabled,
+                'level': self.level,
+                'max_level': len(self.stages),
+                'applied': self.applied(self.level),
+                'stages': self.stages,
+                'changes': self.changes,
+                'last_signals': dict(self._last_signals),
+                'seconds_at_level': {
+                    str(level): seconds for level, seconds in enumerate(self.level_seconds)
+                }
+            }
+
+
+overload = OverloadController()
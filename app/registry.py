@@ -0,0 +1,130 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.models import SafetyMonitor, safety_monitor
+
+MODEL_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+class ModelRegistry:
+    """
+    Named models for per-request selection (A/B tests). Every name is a
+    SafetyMonitor with its own batch scheduler, so batches never mix
+    models. Loading weights under an existing name hot-swaps them: the new
+    model is loaded and warmed up in a background thread while the old one
+    keeps serving, then replaces it in one assignment.
+
+    The default model is the global safety_monitor; extra models from
+    settings.models run in the API process even with inference_workers.
+    """
+
+    def __init__(self, default: SafetyMonitor):
+        self.default_name = settings.default_model_name
+        self.monitors: Dict[str, SafetyMonitor] = {self.default_name: default}
+        self.loads: Dict[str, Dict[str, Any]] = {}  # name -> state of the last load
+        self._lock = threading.Lock()
+
+    def get(self, model: Optional[str] = None) -> SafetyMonitor:
+        """Model by name or by version, default model for None; KeyError if unknown"""
+        if not model:
+            return self.monitors[self.default_name]
+        monitor = self.monitors.get(model)
+        if monitor is not None:
+            return monitor
+        for monitor in list(self.monitors.values()):
+            if monitor.model_version == model:
+                return monitor
+        raise KeyError(model)
+
+    def resolve_path(self, model_path: str) -> str:
+        """Weights path under model_dir, ValueError outside of it"""
+        root = os.path.realpath(settings.model_dir)
+        resolved = os.path.realpath(os.path.join(root, model_path))
+        if os.path.commonpath([root, resolved]) != root:
+            raise ValueError("Model path must be inside the model directory")
+        if not os.path.exists(resolved):
+            raise ValueError("Model file not found")
+        return resolved
+
+    def load(self, name: str, model_path: str = None) -> threading.Thread:
+        """
+        Load (or replace) model `name` in the background. model_path may be
+        omitted for an existing model only (reload of its weights)
+        """
+        if not MODEL_NAME.match(name):
+            raise ValueError("Model name may contain letters, digits, '_', '.' and '-'")
+        with self._lock:
+            state = self.loads.get(name)
+            if state is not None and state['status'] == 'loading':
+                raise RuntimeError(f"Model {name} is already loading")
+            monitor = self.monitors.get(name)
+            if monitor is None and not model_path:
+                # SafetyMonitor would fall back to the default weights
+                raise ValueError(f"Weights path is required for new model {name}")
+            if monitor is not None and monitor.pool is not None:
+                raise RuntimeError("Reload is not supported with inference_workers > 0")
+            if monitor is not None and not monitor.is_ready():
+                raise RuntimeError(f"Model {name} is not loaded yet")
+            self.loads[name] = {
+                'status': 'loading',
+                'model_path': model_path,
+                'started_at': time.time(),
+                'finished_at': None,
+                'error': None
+            }
+        thread = threading.Thread(
+            target=self._load, args=(name, model_path), name=f"model-load-{name}", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _load(self, name: str, model_path: Optional[str]):
+        state = self.loads[name]
+        try:
+            monitor = self.monitors.get(name)
+            if monitor is not None:
+                monitor.reload(model_path)
+            else:
+                monitor = SafetyMonitor(load=False, model_path=model_path)
+                if not monitor.warmup():
+                    raise RuntimeError(monitor.load_error)
+                with self._lock:
+                    self.monitors[name] = monitor
+            state['status'] = 'ready'
+            state['version'] = monitor.model_version
+        except Exception as e:
+            state['status'] = 'failed'
+            state['error'] = str(e)
+            print(f"Model {name} load failed: {e}")
+        finally:
+            state['finished_at'] = time.time()
+
+    def start(self):
+        """Background load of the extra models from settings"""
+        for name, model_path in settings.models.items():
+            if name != self.default_name:
+                self.load(name, model_path)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            names = set(self.monitors) | set(self.loads)
+            monitors = dict(self.monitors)
+            loads = {name: dict(state) for name, state in self.loads.items()}
+        models = []
+        for name in sorted(names):
+            monitor = monitors.get(name)
+            models.append({
+                'name': name,
+                'default': name == self.default_name,
+                'ready': monitor is not None and monitor.is_ready(),
+                'version': monitor.model_version if monitor is not None else None,
+                'previous_version': monitor.previous_version if monitor is not None else None,
+                'last_load': loads.get(name)
+            })
+        return models
+
+
+model_registry = ModelRegistry(safety_monitor)
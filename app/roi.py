@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from app.config import settings
+
+
+def rect_to_polygon(rect: List[float]) -> List[List[float]]:
+    x1, y1, x2, y2 = rect
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+
+def polygons_to_pixels(polygons: List[np.ndarray], width: int, height: int) -> List[np.ndarray]:
+    """Normalized polygons to pixel coordinates of a width x height frame"""
+    scale = np.array([width, height], dtype=np.float64)
+    # pointPolygonTest takes float32 or int32 points
+    return [(polygon * scale).astype(np.float32) for polygon in polygons]
+
+
+def region_crops(polygons: List[np.ndarray], width: int, height: int,
+                 padding: float, split_ratio: float) -> List[Tuple[int, int, int, int]]:
+    """
+    Crops covering the polygons (pixel coordinates), padded by a share of
+    their size so that people at the border are seen whole. One crop of
+    the union unless separate crops would cover under split_ratio of its area.
+    """
+    boxes = []
+    for polygon in polygons:
+        x1, y1 = polygon.min(axis=0)
+        x2, y2 = polygon.max(axis=0)
+        pad_x, pad_y = (x2 - x1) * padding, (y2 - y1) * padding
+        box = (
+            max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y)),
+            min(width, int(np.ceil(x2 + pad_x))), min(height, int(np.ceil(y2 + pad_y)))
+        )
+        if box[2] > box[0] and box[3] > box[1]:
+            boxes.append(box)
+    if not boxes:
+        return []
+
+    union = (
+        min(box[0] for box in boxes), min(box[1] for box in boxes),
+        max(box[2] for box in boxes), max(box[3] for box in boxes)
+    )
+    union_area = (union[2] - union[0]) * (union[3] - union[1])
+    separate_area = sum((box[2] - box[0]) * (box[3] - box[1]) for box in boxes)
+    if len(boxes) > 1 and separate_area < split_ratio * union_area:
+        return boxes
+    return [union]
+
+
+def inside_regions(xyxy: np.ndarray, polygons: List[np.ndarray]) -> np.ndarray:
+    """Boxes whose center lies in any polygon (pixel coordinates)"""
+    keep = np.zeros(len(xyxy), dtype=bool)
+    centers = (xyxy[:, :2] + xyxy[:, 2:]) / 2
+    for i, (x, y) in enumerate(centers.tolist()):
+        keep[i] = any(
+            cv2.pointPolygonTest(polygon, (x, y), False) >= 0 for polygon in polygons
+        )
+    return keep
+
+
+def predict_regions(monitor, image: np.ndarray, polygons: List[np.ndarray],
+                    confidence_threshold: float, with_detections: bool = True, imgsz: int = None):
+    """Inference on crops of the regions of interest, returns (result, crops)"""
+    height, width = image.shape[:2]
+    pixel_polygons = polygons_to_pixels(polygons, width, height)
+    crops = region_crops(pixel_polygons, width, height, settings.roi_padding, settings.roi_split_ratio)
+    if not crops:
+        # Degenerate regions (all points on a line)
+        crops = [(0, 0, width, height)]
+    result = monitor.predict_roi(
+        image, crops, lambda xyxy: inside_regions(xyxy, pixel_polygons),
+        confidence_threshold, with_detections, imgsz
+    )
+    return result, crops
+
+
+class RoiStats:
+    """Pixels and predict latency of one camera's frames"""
+
+    __slots__ = ('frames', 'frame_pixels', 'processed_pixels', 'crops', 'predict_seconds', 'saved_seconds')
+
+    def __init__(self):
+        self.frames = 0
+        self.frame_pixels = 0
+        self.processed_pixels = 0
+        self.crops = 0
+        self.predict_seconds = 0.0
+        self.saved_seconds = 0.0
+
+
+class RoiStore:
+    """
+    Regions of interest per camera: polygons in normalized (0..1) frame
+    coordinates, kept in roi_file. Frames of a camera with regions are
+    inferred on crops of the regions only and detections outside them are
+    dropped.
+
+    Latency saved is estimated against the running mean predict time of
+    full frames of the same size class (cameras without regions), it is
+    not measured on the same frame.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path if path is not None else settings.roi_file
+        self.regions: Dict[str, Tuple[int, List[np.ndarray]]] = {}  # camera -> (revision, polygons)
+        self.cameras: Dict[str, RoiStats] = {}
+        self.full_frame_seconds: Dict[int, float] = {}  # megapixels rounded -> mean predict time
+        self.revision = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+            for camera_id, polygons in stored.items():
+                self.set(camera_id, polygons, save=False)
+            print(f"Loaded regions of interest of {len(stored)} cameras")
+        except (OSError, ValueError) as e:
+            print(f"Error loading regions of interest: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                camera_id: [polygon.tolist() for polygon in polygons]
+                for camera_id, (_, polygons) in self.regions.items()
+            }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+
+    def set(self, camera_id: str, polygons: List[List[List[float]]], save: bool = True):
+        """Replace the regions of a camera, ValueError on invalid polygons"""
+        arrays = []
+        for polygon in polygons:
+            array = np.array(polygon, dtype=np.float64)
+            if array.ndim != 2 or array.shape[1] != 2 or len(array) < 3:
+                raise ValueError("A region needs at least 3 [x, y] points")
+            if array.min() < 0 or array.max() > 1:
+                raise ValueError("Region coordinates must be fractions of frame size (0..1)")
+            arrays.append(array)
+        if not arrays:
+            raise ValueError("No regions given")
+        with self._lock:
+            self.revision += 1
+            self.regions[camera_id] = (self.revision, arrays)
+        if save:
+            self.save()
+
+    def delete(self, camera_id: str) -> bool:
+        with self._lock:
+            removed = self.regions.pop(camera_id, None) is not None
+            self.cameras.pop(camera_id, None)
+        if removed:
+            self.save()
+        return removed
+
+    def get(self, camera_id: Optional[str]) -> Optional[Tuple[int, List[np.ndarray]]]:
+        """(revision, normalized polygons) of the camera, None without regions"""
+        if camera_id is None:
+            return None
+        return self.regions.get(camera_id)
+
+    def observe_full_frame(self, width: int, height: int, seconds: float):
+        """Predict time of a whole frame, the baseline for latency saved"""
+        size_class = round(width * height / 1e6)
+        with self._lock:
+            mean = self.full_frame_seconds.get(size_class)
+            self.full_frame_seconds[size_class] = seconds if mean is None else 0.9 * mean + 0.1 * seconds
+
+    def observe(self, camera_id: str, width: int, height: int, crops, seconds: float):
+        with self._lock:
+            stats = self.cameras.get(camera_id)
+            if stats is None:
+                stats = self.cameras[camera_id] = RoiStats()
+            stats.frames += 1
+            stats.frame_pixels += width * height
+            stats.processed_pixels += sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in crops)
+            stats.crops += len(crops)
+            stats.predict_seconds += seconds
+            baseline = self.full_frame_seconds.get(round(width * height / 1e6))
+            if baseline is not None:
+                stats.saved_seconds += baseline - seconds
+
+    def stats(self, camera_id: str = None) -> Dict[str, Any]:
+        with self._lock:
+            cameras = {
+                name: stats for name, stats in self.cameras.items()
+                if camera_id is None or name == camera_id
+            }
+            return {
+                'cameras_with_regions': len(self.regions),
+                'full_frame_predict_seconds': {
+                    f'{size_class}MP': seconds for size_class, seconds in self.full_frame_seconds.items()
+                },
+                'cameras': {
+                    name: {
+                        'frames': stats.frames,
+                        'crops_per_frame': stats.crops / stats.frames,
+                        'pixels_processed_ratio': stats.processed_pixels / stats.frame_pixels,
+                        'pixels_saved': stats.frame_pixels - stats.processed_pixels,
+                        'predict_seconds_mean': stats.predict_seconds / stats.frames,
+                        'latency_saved_seconds': stats.saved_seconds
+                    }
+                    for name, stats in cameras.items() if stats.frames
+                }
+            }
+
+
+roi_store = RoiStore()
@@ -0,0 +1,1237 @@
+from fastapi import APIRouter, UploadFile, File, Header, HTTPException, Query, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
+import asyncio
+import contextvars
+import cv2
+import numpy as np
+from typing import Any, Callable, List, Optional
+import base64
+import functools
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+
+
+from app.cache import result_cache
+from app.config import settings
+from app.executor import executor, QueueFullError
+from app.history import history_store
+from app.metrics import metrics, timed
+from app.scene_gate import scene_gate
+from app.serialization import dumps, fast_response, prefers_msgpack
+from app.models import SafetyMonitor, safety_monitor
+from app.overload import overload
+from app.registry import model_registry
+from app.roi import predict_regions, rect_to_polygon, roi_store
+from app.storage import result_store
+from app.temporal import temporal_compliance
+from app.video import VideoJob, resolve_local_path, video_jobs
+from app.schemas import (
+    DetectionResponse, 
+    DetectionResponseWithImage,
+    ImageBase64, 
+    RegionsOfInterest,
+    HealthCheck
+)
+from app.utils import (
+    ENCODE_FORMATS,
+    decode_image_bytes,
+    draw_detections,
+    encode_image,
+    image_to_base64,
+    rescale_detections,
+    rescale_result
+)
+
+
+# perf_counter() of endpoint return, per request
+_endpoint_returned = contextvars.ContextVar("endpoint_returned", default=None)
+
+
+class TimedRoute(APIRoute):
+    """
+    Route that records time from endpoint return to finished Response
+    (response_model validation and JSON rendering) as 'serialize' stage.
+    Endpoints returning a Response time their own serialization
+    """
+    
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            call = endpoint
+            
+            @functools.wraps(call)
+            async def endpoint(*args, **kwargs):
+                result = await call(*args, **kwargs)
+                returned = _endpoint_returned.get()
+                if returned is not None and not isinstance(result, Response):
+                    returned.append(time.perf_counter())
+                return result
+        super().__init__(path, endpoint, **kwargs)
+    
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        
+        async def timed_handler(request):
+            returned = []
+            token = _endpoint_returned.set(returned)
+            try:
+                response = await handler(request)
+            finally:
+                _endpoint_returned.reset(token)
+            if returned:
+                metrics.observe_stage('serialize', time.perf_counter() - returned[0])
+            return response
+        
+        return timed_handler
+
+
+router = APIRouter(prefix="/api/v1/detection", tags=["detection"], route_class=TimedRoute)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+
+
+def decode_image(contents: bytes, error_detail: str = "Failed to read image",
+                 reduced: bool = True):
+    """
+    Decode image bytes to numpy array, oversized JPEGs at reduced resolution
+    unless reduced=False. Returns (image, original width, original height)
+    """
+    target_size = settings.model_input_size if settings.reduced_decode and reduced else None
+    image, width, height = decode_image_bytes(contents, target_size)
+    
+    if image is None:
+        raise HTTPException(status_code=400, detail=error_detail)
+    
+    metrics.observe_image(width=width, height=height)
+    return image, width, height
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Read uploaded file recording 'read' stage and image size. The body is
+    already received and parsed by then, network time is only in endpoint latency
+    """
+    start_time = time.perf_counter()
+    contents = await file.read()
+    metrics.observe_stage('read', time.perf_counter() - start_time)
+    metrics.observe_image(size_bytes=len(contents))
+    return contents
+
+
+def save_result_image(image: np.ndarray) -> str:
+    """Encode result image and hand it to the result store, returns file name"""
+    return result_store.put(encode_image(image, 'jpeg', settings.storage_quality))
+
+
+def process_image(
+    contents: bytes,
+    confidence_threshold: Optional[float],
+    output: Optional[Callable[[np.ndarray], Any]] = None,
+    error_detail: str = "Failed to read image",
+    with_detections: bool = True,
+    preview_width: Optional[int] = None,
+    tiled: Optional[bool] = None,
+    camera_id: Optional[str] = None,
+    monitor: Optional[SafetyMonitor] = None,
+    overload_level: int = 0
+) -> dict:
+    """
+    CPU-bound part of a detection request, runs in the worker pool:
+    decode, inference and optionally drawing + output of annotated image.
+    tiled: tiled inference of large images, None = settings.tiling_enabled
+    camera_id: unchanged frames of the camera reuse its last result,
+    cameras with regions of interest are inferred on crops of them
+    monitor: model selected by the request, default model if None
+    overload_level: degradation stages to apply, see OverloadController
+    """
+    image_array = None
+    monitor = monitor or safety_monitor
+    if tiled is None:
+        tiled = settings.tiling_enabled
+    if confidence_threshold is None:
+        confidence_threshold = settings.confidence_threshold
+    gated = camera_id is not None and settings.gate_enabled
+    regions = roi_store.get(camera_id)
+    roi_revision = regions[0] if regions is not None else None
+    imgsz = overload.input_size(overload_level)
+    params = (confidence_threshold, with_detections, tiled, monitor.model_version, roi_revision, imgsz)
+    
+    def infer():
+        nonlocal image_array
+        if gated and overload.skip_frame(camera_id, overload_level):
+            # Sampled out: no decode, last result of the camera
+            reused = scene_gate.last(camera_id, params)
+            if reused is not None:
+                return reused
+        # Tiles and region crops need the full resolution, so does the
+        # output image (smaller only on request, preview_width)
+        image_array, width, height = decode_image(
+            contents, error_detail, reduced=not (tiled or regions is not None or output is not None)
+        )
+        if gated:
+            with metrics.stage('gate'):
+                reused, small = scene_gate.check(camera_id, image_array, params)
+            if reused is not None:
+                return reused
+        # Blocks this worker only, concurrent workers share one batch
+        start_time = time.perf_counter()
+        with metrics.stage('predict'):
+            if regions is not None:
+                result, crops = predict_regions(
+                    monitor, image_array, regions[1], confidence_threshold, with_detections, imgsz
+                )
+            elif tiled and max(width, height) >= settings.tile_min_image_side:
+                result = monitor.predict_tiled(
+                    image_array, confidence_threshold, with_detections=with_detections, imgsz=imgsz
+                )
+            else:
+                result = monitor.submit(
+                    image_array, confidence_threshold, with_detections=with_detections, imgsz=imgsz
+                ).result()
+        predict_time = time.perf_counter() - start_time
+        overload.observe(predict_time)
+        if regions is not None:
+            roi_store.observe(camera_id, image_array.shape[1], image_array.shape[0], crops, predict_time)
+        elif 'tiles' not in result:
+            roi_store.observe_full_frame(image_array.shape[1], image_array.shape[0], predict_time)
+        # Boxes and frame_size in original image coordinates
+        result = rescale_result(result, width, height)
+        if gated:
+            result['reused'] = False
+            scene_gate.store(camera_id, small, params, result)
+        return result
+    
+    # The gate replaces the content cache for camera frames
+    if settings.cache_enabled and not gated:
+        key = result_cache.make_key(
+            contents, confidence_threshold, monitor.model_version, with_detections, tiled,
+            camera_id if regions is not None else None, roi_revision, imgsz
+        )
+        result = result_cache.get_or_compute(key, infer)
+    else:
+        result = infer()
+    
+    if output is not None:
+        # Cache hit: frame is still needed for drawing
+        if image_array is None:
+            image_array, _, _ = decode_image(contents, error_detail, reduced=False)
+        
+        # Draw on the full size frame
+        frame_size = result['frame_size']
+        if overload.annotate(overload_level):
+            image_with_boxes = draw_detections(
+                image_array, 
+                rescale_detections(
+                    result['detections'],
+                    image_array.shape[1] / frame_size['width'],
+                    image_array.shape[0] / frame_size['height']
+                ), 
+                result['safety_status'],
+                in_place=True,
+                preview_width=preview_width
+            )
+        elif preview_width and image_array.shape[1] > preview_width:
+            image_with_boxes = cv2.resize(
+                image_array,
+                (preview_width, round(image_array.shape[0] * preview_width / image_array.shape[1])),
+                interpolation=cv2.INTER_AREA
+            )
+        else:
+            image_with_boxes = image_array
+        start_time = time.perf_counter()
+        result['output'] = output(image_with_boxes)
+        result['output_time'] = time.perf_counter() - start_time
+    
+    result['overload_level'] = overload_level
+    history_store.record(camera_id, result)
+    return result
+
+
+def process_base64_image(image_base64: str, confidence_threshold: Optional[float],
+                         camera_id: Optional[str] = None, monitor: Optional[SafetyMonitor] = None,
+                         overload_level: int = 0) -> dict:
+    """Same as process_image for base64 payload, no image under skip_annotation"""
+    with metrics.stage('read'):
+        contents = base64.b64decode(image_base64)
+    metrics.observe_image(size_bytes=len(contents))
+    return process_image(
+        contents,
+        confidence_threshold,
+        image_to_base64 if overload.annotate(overload_level) else None,
+        "Invalid base64 image format",
+        camera_id=camera_id,
+        monitor=monitor,
+        overload_level=overload_level
+    )
+
+
+class LatestFrame:
+    """Single-slot buffer of a stream: a new frame replaces the unprocessed one"""
+    
+    def __init__(self):
+        self.frame = None
+        self.closed = False
+        self._event = asyncio.Event()
+    
+    def put(self, frame) -> bool:
+        """Store frame, returns True if an older frame was dropped"""
+        dropped = self.frame is not None
+        self.frame = frame
+        self._event.set()
+        return dropped
+    
+    def close(self):
+        self.closed = True
+        self._event.set()
+    
+    async def get(self):
+        """Wait for the newest frame, None when the stream is closed"""
+        while self.frame is None and not self.closed:
+            self._event.clear()
+            await self._event.wait()
+        frame, self.frame = self.frame, None
+        return frame
+
+
+async def run_when_free(fn, *args, **kwargs):
+    """
+    executor.run_background that waits for a free slot instead of failing;
+    its backlog does not count as overload of the interactive endpoints
+    """
+    while True:
+        try:
+            return await executor.run_background(fn, *args, **kwargs)
+        except QueueFullError:
+            await asyncio.sleep(settings.retry_after_seconds)
+
+
+async def spool_upload(file: UploadFile):
+    """Copy upload to a temporary file of our own, it outlives the request's UploadFile"""
+    spool = tempfile.TemporaryFile()
+    try:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, spool)
+    except Exception:
+        spool.close()
+        raise
+    return spool
+
+
+def read_spool(spool) -> bytes:
+    """Whole content of a spooled upload, recording 'read' stage and image size"""
+    start_time = time.perf_counter()
+    spool.seek(0)
+    contents = spool.read()
+    metrics.observe_stage('read', time.perf_counter() - start_time)
+    metrics.observe_image(size_bytes=len(contents))
+    return contents
+
+
+async def iter_upload_chunks(uploads: List[tuple], chunk_size: int):
+    """Yield (index, filename, bytes) chunks of spooled (filename, file) uploads, read one chunk at a time"""
+    for start in range(0, len(uploads), chunk_size):
+        chunk = []
+        for offset, (filename, spool) in enumerate(uploads[start:start + chunk_size]):
+            chunk.append((start + offset, filename, await asyncio.to_thread(read_spool, spool)))
+        yield chunk
+
+
+async def iter_archive_chunks(archive: zipfile.ZipFile, chunk_size: int):
+    """Yield (index, filename, bytes) chunks of images in zip archive"""
+    names = [
+        info.filename for info in archive.infolist()
+        if not info.is_dir() and os.path.splitext(info.filename)[1].lower() in IMAGE_EXTENSIONS
+    ]
+    for start in range(0, len(names), chunk_size):
+        chunk_names = names[start:start + chunk_size]
+        start_time = time.perf_counter()
+        contents = await asyncio.to_thread(lambda: [archive.read(name) for name in chunk_names])
+        metrics.observe_stage('read', time.perf_counter() - start_time)
+        for data in contents:
+            metrics.observe_image(size_bytes=len(data))
+        yield [
+            (start + offset, name, data)
+            for offset, (name, data) in enumerate(zip(chunk_names, contents))
+        ]
+
+
+async def detect_chunk(chunk, confidence_threshold: Optional[float], monitor: SafetyMonitor = None):
+    """Run one model-sized chunk, yield NDJSON line per image as it finishes"""
+    async def detect_one(index: int, filename: str, contents: bytes) -> str:
+        try:
+            result, _ = await run_when_free(
+                process_image, contents, confidence_threshold, monitor=monitor,
+                overload_level=overload.current()
+            )
+            line = {
+                "index": index,
+                "filename": filename,
+                "status": "success",
+                "detections": result['detections'],
+                "safety_status": result['safety_status'],
+                "persons": result['persons'],
+                "frame_size": result['frame_size'],
+                "inference_time": result['inference_time'],
+                "model_version": result.get('model_version'),
+                "overload_level": result['overload_level']
+            }
+        except HTTPException as e:
+            line = {"index": index, "filename": filename, "status": "error", "detail": e.detail}
+        except Exception as e:
+            line = {"index": index, "filename": filename, "status": "error",
+                    "detail": f"Image processing error: {str(e)}"}
+        with metrics.stage('serialize'):
+            return dumps(line) + b"\n"
+    
+    for line in asyncio.as_completed([detect_one(*item) for item in chunk]):
+        yield await line
+
+
+def compact_json(data) -> str:
+    return json.dumps(data, separators=(',', ':'))
+
+
+def response_fields(result: dict, message: str, **extra) -> dict:
+    """DetectionResponse fields of a process_image result"""
+    return {
+        "status": "success",
+        "message": message,
+        "detections": result['detections'],
+        "safety_status": result['safety_status'],
+        "persons": result['persons'],
+        "frame_size": result['frame_size'],
+        "inference_time": result['inference_time'],
+        "model_version": result.get('model_version'),
+        "reused": result.get('reused'),
+        "overload_level": result.get('overload_level'),
+        **extra
+    }
+
+
+def use_fast_response(fast: Optional[bool], layout: str, accept: Optional[str]) -> bool:
+    """Columnar layout and MessagePack exist on the fast path only"""
+    if fast is None:
+        fast = settings.fast_responses
+    return fast or layout == "columnar" or prefers_msgpack(accept)
+
+
+@timed('serialize')
+def image_response(result: dict, image_format: str, response_mode: str) -> Response:
+    """Annotated image as raw body (metadata in headers) or multipart/mixed"""
+    media_type = ENCODE_FORMATS[image_format][2]
+    metadata = {
+        "detections": result['detections'],
+        "safety_status": result['safety_status'],
+        "persons": result['persons'],
+        "frame_size": result['frame_size'],
+        "inference_time": result['inference_time'],
+        "model_version": result.get('model_version'),
+        "overload_level": result.get('overload_level', 0)
+    }
+    
+    if response_mode == "multipart":
+        boundary = uuid.uuid4().hex
+        body = b"".join([
+            f"--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode(),
+            compact_json(metadata).encode(),
+            f"\r\n--{boundary}\r\nContent-Type: {media_type}\r\n\r\n".encode(),
+            result['output'],
+            f"\r\n--{boundary}--\r\n".encode()
+        ])
+        return Response(
+            content=body,
+            media_type=f"multipart/mixed; boundary={boundary}",
+            headers={"X-Encode-Time": f"{result['output_time']:.6f}"}
+        )
+    
+    headers = {
+        "X-Safety-Status": compact_json(result['safety_status']),
+        "X-Frame-Size": compact_json(result['frame_size']),
+        "X-Inference-Time": f"{result['inference_time']:.6f}",
+        "X-Encode-Time": f"{result['output_time']:.6f}",
+        "X-Model-Version": result.get('model_version') or "",
+        "X-Overload-Level": str(result.get('overload_level', 0)),
+        "X-Detections-Count": str(len(result['detections']))
+    }
+    # Large detection lists do not fit in headers, use multipart for them
+    detections = compact_json(result['detections'])
+    if len(detections) <= settings.max_detections_header_bytes:
+        headers["X-Detections"] = detections
+    return Response(content=result['output'], media_type=media_type, headers=headers)
+
+
+def check_model_ready(model: Optional[str] = None) -> SafetyMonitor:
+    """Model selected by the request, rejected until loaded and warmed up"""
+    try:
+        monitor = model_registry.get(model)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown model: {model}")
+    if not monitor.is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail="Model not loaded",
+            headers={"Retry-After": str(settings.retry_after_seconds)}
+        )
+    return monitor
+
+
+def server_busy() -> HTTPException:
+    """Fast rejection when worker queue is full"""
+    return HTTPException(
+        status_code=429,
+        detail="Server is busy, try again later",
+        headers={"Retry-After": str(settings.retry_after_seconds)}
+    )
+
+
+def track_camera(camera_id: Optional[str], result: dict) -> Optional[dict]:
+    """Add result to the debounced state of the camera, None without camera_id"""
+    if camera_id is None:
+        return None
+    return temporal_compliance.update(camera_id, result['safety_status'])
+
+
+@router.get("/health", response_model=HealthCheck)
+async def health_check():
+    """API health check"""
+    return {
+        "status": "healthy",
+        "version": "1.0.0",
+        "model_loaded": safety_monitor.is_model_loaded(),
+        "model_version": safety_monitor.model_version
+    }
+
+
+@router.get("/ready")
+async def readiness_check():
+    """Readiness check: 503 until model is loaded and warmed up"""
+    ready = safety_monitor.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "loading",
+            "model_loaded": safety_monitor.is_model_loaded(),
+            "model_version": safety_monitor.model_version,
+            "error": safety_monitor.load_error,
+            "timings": safety_monitor.get_timings()
+        }
+    )
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Detection result cache counters"""
+    return {"enabled": settings.cache_enabled, **result_cache.stats()}
+
+
+@router.get("/results/{name}")
+async def get_result_image(name: str):
+    """Annotated image saved by /detect-and-save, 404 once evicted"""
+    stored = result_store.get(name)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    if isinstance(stored, bytes):
+        # Still in the write queue
+        return Response(content=stored, media_type="image/jpeg")
+    return FileResponse(stored, media_type="image/jpeg")
+
+
+@router.get("/storage/stats")
+async def storage_stats():
+    """Result image storage counters"""
+    return result_store.stats()
+
+
+@router.get("/cameras/stats")
+async def camera_stats():
+    """Tracked cameras and event counters"""
+    return temporal_compliance.stats()
+
+
+@router.get("/cameras/{camera_id}")
+async def camera_state(camera_id: str):
+    """Debounced compliance state of a camera"""
+    state = temporal_compliance.state(camera_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Camera not tracked")
+    return state
+
+
+@router.get("/models")
+async def list_models():
+    """Registered models with versions and the state of their last load"""
+    return {"models": model_registry.describe()}
+
+
+@router.post("/models/{name}/load", status_code=202)
+async def load_model(
+    name: str,
+    path: Optional[str] = Query(
+        None, description="Weights file under the model directory; required for a new name, same file if omitted"
+    )
+):
+    """
+    Load weights as model `name` in the background. An existing model keeps
+    serving until the new weights are loaded and warmed up, then they are
+    swapped in; requests already running finish on the old model
+    """
+    try:
+        model_path = model_registry.resolve_path(path) if path else None
+        model_registry.load(name, model_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"name": name, "status": "loading", "status_url": f"{router.prefix}/models"}
+
+
+@router.get("/roi/stats")
+async def roi_stats(camera_id: Optional[str] = Query(None, description="Only this camera")):
+    """Per camera: share of pixels inferred, crops per frame and estimated latency saved"""
+    return roi_store.stats(camera_id)
+
+
+@router.get("/cameras/{camera_id}/roi")
+async def get_camera_roi(camera_id: str):
+    """Regions of interest of a camera, normalized polygons"""
+    regions = roi_store.get(camera_id)
+    if regions is None:
+        raise HTTPException(status_code=404, detail="Camera has no regions of interest")
+    return {"camera_id": camera_id, "polygons": [polygon.tolist() for polygon in regions[1]]}
+
+
+@router.put("/cameras/{camera_id}/roi")
+async def set_camera_roi(camera_id: str, request: RegionsOfInterest):
+    """
+    Set regions of interest of a camera: polygons ([[x, y], ...]) and / or
+    rectangles ([x1, y1, x2, y2]) as fractions of frame width and height.
+    Frames of the camera are inferred on crops of the regions, detections
+    outside them are dropped
+    """
+    try:
+        polygons = list(request.polygons) + [rect_to_polygon(rect) for rect in request.rectangles]
+        await asyncio.to_thread(roi_store.set, camera_id, polygons)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await get_camera_roi(camera_id)
+
+
+@router.delete("/cameras/{camera_id}/roi")
+async def delete_camera_roi(camera_id: str):
+    """Infer whole frames of the camera again"""
+    if not await asyncio.to_thread(roi_store.delete, camera_id):
+        raise HTTPException(status_code=404, detail="Camera has no regions of interest")
+    return {"camera_id": camera_id, "status": "deleted"}
+
+
+@router.get("/gate/stats")
+async def gate_stats(camera_id: Optional[str] = Query(None, description="Counters of one camera")):
+    """Scene-change gate counters, skip_ratio = share of frames that reused a result"""
+    stats = scene_gate.stats(camera_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Camera not tracked")
+    return stats
+
+
+def history_range(since: Optional[float], until: Optional[float]):
+    """Query range in unix seconds, last 24 hours by default; 503 without a history store"""
+    if not history_store.is_running():
+        raise HTTPException(
+            status_code=503,
+            detail="Detection history is not enabled (set HISTORY_ENABLED=true)"
+            if not settings.history_enabled else "Detection history is not started"
+        )
+    until = until if until is not None else time.time()
+    since = since if since is not None else until - 86400
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    return since, until
+
+
+@router.get("/history/stats")
+async def history_stats():
+    return history_store.stats()
+
+
+@router.get("/history/counts")
+async def history_counts(
+    since: Optional[float] = Query(None, description="Unix time, default 24 hours before until"),
+    until: Optional[float] = Query(None, description="Unix time, default now"),
+    camera_id: Optional[str] = Query(None, max_length=128, description="Only this camera")
+):
+    """Frames, violation frames and frames per violation type in a time range (whole minutes)"""
+    since, until = history_range(since, until)
+    return await asyncio.to_thread(history_store.counts, since, until, camera_id)
+
+
+@router.get("/history/buckets")
+async def history_buckets(
+    since: Optional[float] = Query(None, description="Unix time, default 24 hours before until"),
+    until: Optional[float] = Query(None, description="Unix time, default now"),
+    bucket_seconds: int = Query(3600, ge=60, description="Bucket size, a multiple of 60"),
+    camera_id: Optional[str] = Query(None, max_length=128, description="Only this camera"),
+    violation: Optional[str] = Query(None, description="Count frames with this violation, e.g. 'No helmet'")
+):
+    """Counts per time bucket, buckets without frames are left out"""
+    since, until = history_range(since, until)
+    if bucket_seconds % 60:
+        raise HTTPException(status_code=400, detail="bucket_seconds must be a multiple of 60")
+    try:
+        buckets = await asyncio.to_thread(
+            history_store.buckets, since, until, bucket_seconds, camera_id, violation
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"bucket_seconds": bucket_seconds, "buckets": buckets}
+
+
+@router.get("/history/frames")
+async def history_frames(
+    since: Optional[float] = Query(None, description="Unix time, default 24 hours before until"),
+    until: Optional[float] = Query(None, description="Unix time, default now"),
+    camera_id: Optional[str] = Query(None, max_length=128, description="Only this camera"),
+    violation: Optional[str] = Query(None, description="Only frames with this violation, e.g. 'No helmet'"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of frames")
+):
+    """
+    Stored frame results, newest first. For the next page pass until = ts
+    of the oldest frame received
+    """
+    since, until = history_range(since, until)
+    try:
+        frames = await asyncio.to_thread(
+            history_store.frames, since, until, camera_id, violation, limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"frames": frames}
+
+
+@router.get("/overload/stats")
+async def overload_stats():
+    """Current degradation level, its stages and the signals it was set from"""
+    return overload.stats()
+
+
+@router.get("/events")
+async def compliance_events(
+    since: int = Query(0, ge=0, description="Return events after this seq"),
+    camera_id: Optional[str] = Query(None, description="Only events of this camera"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of events")
+):
+    """
+    Debounced compliance changes of all cameras, oldest first. Poll with
+    since = last seq received; older events drop out of a bounded buffer
+    """
+    events = temporal_compliance.events_since(since, camera_id, limit)
+    return {"events": events, "last_seq": events[-1]['seq'] if events else since}
+
+
+@router.websocket("/stream")
+async def detect_stream(
+    websocket: WebSocket,
+    confidence_threshold: Optional[float] = Query(None, description="Confidence threshold for detection"),
+    target_fps: Optional[float] = Query(None, gt=0, description="Max inferences per second, extra frames are dropped"),
+    camera_id: Optional[str] = Query(None, max_length=128, description="Camera id for debounced per-camera compliance"),
+    events_only: bool = Query(False, description="Send only debounced compliance changes"),
+    model: Optional[str] = Query(None, description="Model name or version, default model if omitted")
+):
+    """
+    Safety detection on a video stream
+    
+    - Client sends binary JPEG frames
+    - Server answers with compact safety_status message per inferred frame
+    - If inference falls behind, only the newest frame is kept
+    - With **camera_id** unchanged frames reuse the last result and messages
+      carry the debounced camera state, with **events_only** only its
+      changes are sent
+    """
+    await websocket.accept()
+    try:
+        monitor = check_model_ready(model)
+    except HTTPException as e:
+        await websocket.close(code=1013 if e.status_code == 503 else 1008, reason=e.detail)
+        return
+    
+    stats = {'frames_received': 0, 'frames_inferred': 0, 'frames_dropped': 0}
+    latest = LatestFrame()
+    if events_only and camera_id is None:
+        camera_id = f"stream-{uuid.uuid4().hex}"
+    
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                data = message.get('bytes')
+                if not data:
+                    continue
+                stats['frames_received'] += 1
+                if latest.put((stats['frames_received'], data, time.perf_counter())):
+                    stats['frames_dropped'] += 1
+        finally:
+            latest.close()
+    
+    receiver = asyncio.create_task(receive_frames())
+    min_interval = 1.0 / target_fps if target_fps else 0.0
+    
+    try:
+        while True:
+            frame = await latest.get()
+            if frame is None:
+                break
+            index, data, received_at = frame
+            started_at = time.perf_counter()
+            
+            try:
+                result, _ = await executor.run(
+                    process_image, data, confidence_threshold, None,
+                    with_detections=False, camera_id=camera_id, monitor=monitor,
+                    overload_level=overload.current()
+                )
+            except QueueFullError:
+                stats['frames_dropped'] += 1
+                continue
+            except HTTPException as e:
+                await websocket.send_text(json.dumps({'frame': index, 'error': e.detail}, separators=(',', ':')))
+                continue
+            
+            stats['frames_inferred'] += 1
+            temporal = track_camera(camera_id, result)
+            if not events_only or temporal['event'] is not None:
+                message = {
+                    'frame': index,
+                    'safety_status': result['safety_status'],
+                    'inference_time': round(result['inference_time'], 4),
+                    'reused': result.get('reused', False),
+                    'model_version': result.get('model_version'),
+                    'overload_level': result['overload_level'],
+                    'latency': round(time.perf_counter() - received_at, 4),
+                    'stats': stats
+                }
+                if temporal is not None:
+                    message['temporal'] = temporal
+                await websocket.send_text(json.dumps(message, separators=(',', ':')))
+            
+            # Limit inference rate, frames arriving meanwhile replace each other
+            if min_interval:
+                await asyncio.sleep(max(0.0, started_at + min_interval - time.perf_counter()))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Stream error: {e}")
+    finally:
+        receiver.cancel()
+
+
+@router.post("/detect", response_model=DetectionResponse)
+async def detect(
+    image: UploadFile = File(...),
+    confidence_threshold: Optional[float] = Query(None, description="Confidence threshold for detection"),
+    return_image: bool = Query(False, description="Return image with bounding boxes"),
+    tiled: Optional[bool] = Query(None, description="Tiled inference for large images, default from settings"),
+    camera_id: Optional[str] = Query(None, max_length=128, description="Camera id for debounced per-camera compliance"),
+    model: Optional[str] = Query(None, description="Model name or version, default model if omitted"),
+    fast: Optional[bool] = Query(None, description="Skip response validation, faster JSON; default from settings"),
+    layout: str = Query("rows", pattern="^(rows|columnar)$", description="rows or columnar (parallel arrays)"),
+    accept: Optional[str] = Header(None, include_in_schema=False)
+):
+    """
+    Safety object detection on image
+    
+    - **image**: Image for analysis
+    - **confidence_threshold**: Confidence threshold (default 0.3)
+    - **return_image**: If True, returns image with bounding boxes in base64
+    - **tiled**: Detect on overlapping tiles of large (drone, panorama) images
+    - **camera_id**: Reuse the last result of the camera while the scene is
+      unchanged, also return its debounced compliance state
+    - **model**: Named model or model version, for A/B tests
+    - **fast**: Serialize the result without per-item validation, with
+      **layout=columnar** detections as parallel arrays; MessagePack with
+      `Accept: application/msgpack` (both imply fast)
+    """
+    try:
+        # Check if model is loaded
+        monitor = check_model_ready(model)
+        
+        # Check file type
+        if not image.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
+        # Read image
+        contents = await read_upload(image)
+        level = overload.current()
+        
+        # Decode, predict and draw in worker pool
+        result, queue_stats = await executor.run(
+            process_image,
+            contents,
+            confidence_threshold,
+            image_to_base64 if return_image and overload.annotate(level) else None,
+            tiled=tiled,
+            camera_id=camera_id,
+            monitor=monitor,
+            overload_level=level
+        )
+        temporal = track_camera(camera_id, result)
+        
+        # If need to return image
+        if return_image:
+            fields = response_fields(
+                result, "Detection completed with image",
+                image_base64=result.get('output'), temporal=temporal, **queue_stats
+            )
+            if use_fast_response(fast, layout, accept):
+                return fast_response(fields, accept, layout, monitor.classes)
+            return DetectionResponseWithImage(**fields)
+        
+        # Return JSON only
+        fields = response_fields(result, "Detection completed", temporal=temporal, **queue_stats)
+        if use_fast_response(fast, layout, accept):
+            return fast_response(fields, accept, layout, monitor.classes)
+        return DetectionResponse(**fields)
+        
+    except HTTPException:
+        raise
+    except QueueFullError:
+        raise server_busy()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Image processing error: {str(e)}")
+
+
+@router.post("/detect-image")
+async def detect_image(
+    image: UploadFile = File(...),
+    confidence_threshold: Optional[float] = Query(None, description="Confidence threshold for detection"),
+    image_format: str = Query(settings.output_format, pattern="^(jpeg|webp)$", description="jpeg or webp"),
+    quality: int = Query(settings.output_quality, ge=1, le=100, description="Encode quality"),
+    max_width: int = Query(settings.output_max_width, ge=0, description="Downscale wider images, 0 = keep size"),
+    response_mode: str = Query("image", pattern="^(image|multipart)$", description="image or multipart"),
+    tiled: Optional[bool] = Query(None, description="Tiled inference for large images, default from settings"),
+    camera_id: Optional[str] = Query(None, max_length=128, description="Camera id for debounced per-camera compliance"),
+    model: Optional[str] = Query(None, description="Model name or version, default model if omitted")
+):
+    """
+    Safety detection returning annotated image as binary body
+    
+    - **response_mode=image**: raw image/jpeg or image/webp body, safety status
+      and (if small enough) detections in X-* headers
+    - **response_mode=multipart**: multipart/mixed with JSON part and image part
+    - **camera_id**: debounced camera state in X-Camera-* headers
+    """
+    try:
+        # Check if model is loaded
+        monitor = check_model_ready(model)
+        
+        # Check file type
+        if not image.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
+        # Read image
+        contents = await read_upload(image)
+        
+        # Decode, predict, draw and encode in worker pool
+        result, queue_stats = await executor.run(
+            process_image,
+            contents,
+            confidence_threshold,
+            functools.partial(
+                encode_image,
+                image_format=image_format,
+                quality=quality
+            ),
+            preview_width=max_width or None,
+            tiled=tiled,
+            camera_id=camera_id,
+            monitor=monitor,
+            overload_level=overload.current()
+        )
+        
+        response = image_response(result, image_format, response_mode)
+        response.headers["X-Queue-Depth"] = str(queue_stats['queue_depth'])
+        response.headers["X-Queue-Wait-Time"] = f"{queue_stats['queue_wait_time']:.6f}"
+        temporal = track_camera(camera_id, result)
+        if temporal is not None:
+            response.headers["X-Reused"] = str(result.get('reused', False)).lower()
+            response.headers["X-Camera-Compliant"] = str(temporal['compliant']).lower()
+            response.headers["X-Camera-Violations"] = ",".join(temporal['violations'])
+            if temporal['event'] is not None:
+                response.headers["X-Camera-Event"] = compact_json(temporal['event'])
+        return response
+        
+    except HTTPException:
+        raise
+    except QueueFullError:
+        raise server_busy()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Image processing error: {str(e)}")
+
+
+@router.post("/detect-batch")
+async def detect_batch(
+    images: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    confidence_threshold: Optional[float] = Query(None, description="Confidence threshold for detection"),
+    model: Optional[str] = Query(None, description="Model name or version, default model if omitted")
+):
+    """
+    Safety detection on many images in one request
+    
+    - **images**: Several images as multipart files
+    - **archive**: Or one zip archive with images
+    
+    Returns NDJSON stream, one line per image in order of completion
+    ("index" is the position of the image in the request).
+    Images are decoded and inferred in model-sized chunks.
+    """
+    monitor = check_model_ready(model)
+    
+    # Uploads can be closed once the endpoint returns, the stream runs
+    # after that: copy them to own temporary files first, not to memory
+    chunk_size = settings.batch_max_size
+    spools = []
+    zip_file = None
+    try:
+        if archive is not None:
+            spools.append(await spool_upload(archive))
+            try:
+                zip_file = zipfile.ZipFile(spools[0])
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail="Archive must be a zip file")
+            chunks = iter_archive_chunks(zip_file, chunk_size)
+        elif images:
+            uploads = []
+            for file in images:
+                spools.append(await spool_upload(file))
+                uploads.append((file.filename, spools[-1]))
+            chunks = iter_upload_chunks(uploads, chunk_size)
+        else:
+            raise HTTPException(status_code=400, detail="No images or archive provided")
+    except BaseException:
+        for spool in spools:
+            spool.close()
+        raise
+    
+    async def stream_results():
+        try:
+            async for chunk in chunks:
+                async for line in detect_chunk(chunk, confidence_threshold, monitor):
+                    yield line
+        finally:
+            if zip_file is not None:
+                zip_file.close()
+            for spool in spools:
+                spool.close()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@router.post("/detect-and-save")
+async def detect_and_save(
+    image: UploadFile = File(...),
+    confidence_threshold: Optional[float] = Query(None, description="Confidence threshold for detection"),
+    model: Optional[str] = Query(None, description="Model name or version, default model if omitted"),
+    background_tasks: BackgroundTasks = None
+):
+    """
+    Perform detection and save result to file
+    Returns path to saved file
+    """
+    try:
+        # Check if model is loaded
+        monitor = check_model_ready(model)
+        
+        # Check file type
+        if not image.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
+        # Read image
+        contents = await read_upload(image)
+        
+        # Decode, predict, draw and save in worker pool
+        result, queue_stats = await executor.run(
+            process_image,
+            contents,
+            confidence_threshold,
+            save_result_image,
+            monitor=monitor,
+            overload_level=overload.current()
+        )
+        filename = result['output']
+        
+        # Return result with image URL
+        response_data = {
+            "status": "success",
+            "message": "Detection completed and image saved",
+            "detections": result['detections'],
+            "safety_status": result['safety_status'],
+            "persons": result['persons'],
+            "frame_size": result['frame_size'],
+            "inference_time": result['inference_time'],
+            "model_version": result.get('model_version'),
+            "overload_level": result['overload_level'],
+            "image_url": f"http://localhost:8000{router.prefix}/results/{filename}",
+            **queue_stats
+        }
+        
+        return response_data
+        
+    except HTTPException:
+        raise
+    except QueueFullError:
+        raise server_busy()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Image processing error: {str(e)}")
+
+
+@router.post("/detect-base64")
+async def detect_base64(
+    request: ImageBase64,
+    fast: Optional[bool] = Query(None, description="Skip response validation, faster JSON; default from settings"),
+    layout: str = Query("rows", pattern="^(rows|columnar)$", description="rows or columnar (parallel arrays)"),
+    accept: Optional[str] = Header(None, include_in_schema=False)
+):
+    """Safety object detection from base64 string, fast / layout / Accept as in /detect"""
+    try:
+        # Check if model is loaded
+        monitor = check_model_ready(request.model)
+        
+        # Decode, predict and draw in worker pool
+        result, queue_stats = await executor.run(
+            process_base64_image,
+            request.image_base64,
+            request.confidence_threshold,
+            request.camera_id,
+            monitor,
+            overload.current()
+        )
+        
+        fields = response_fields(
+            result, "Detection completed",
+            image_base64=result.get('output'),
+            temporal=track_camera(request.camera_id, result),
+            **queue_stats
+        )
+        if use_fast_response(fast, layout, accept):
+            return fast_response(fields, accept, layout, monitor.classes)
+        return DetectionResponseWithImage(**fields)
+        
+    except HTTPException:
+        raise
+    except QueueFullError:
+        raise server_busy()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Image processing error: {str(e)}")
+
+
+async def save_video_upload(file: UploadFile) -> str:
+    """Copy uploaded video to video_upload_dir in chunks, returns the path"""
+    os.makedirs(settings.video_upload_dir, exist_ok=True)
+    extension = os.path.splitext(file.filename or "")[1].lower() or ".mp4"
+    path = os.path.join(settings.video_upload_dir, f"{uuid.uuid4().hex}{extension}")
+    with open(path, "wb") as f:
+        while True:
+            chunk = await file.read(1024 * 1024)
+            if not chunk:
+                break
+            await asyncio.to_thread(f.write, chunk)
+    return path
+
+
+def get_video_job(job_id: str) -> VideoJob:
+    job = video_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Video job not found")
+    return job
+
+
+@router.post("/video-jobs", status_code=202)
+async def create_video_job(
+    video: Optional[UploadFile] = File(None),
+    path: Optional[str] = Query(None, description="Video file under the server video directory"),
+    confidence_threshold: Optional[float] = Query(None, description="Confidence threshold for detection"),
+    every_n: int = Query(1, ge=1, description="Analyze every Nth frame"),
+    target_fps: Optional[float] = Query(None, gt=0, description="Analyze frames at this rate instead of every_n"),
+    model: Optional[str] = Query(None, description="Model name or version, default model if omitted")
+):
+    """
+    Start analysis of a video file in the background
+    
+    - **video**: Uploaded video file
+    - **path**: Or a file on the server, relative to the video directory
+    
+    Returns job id; progress at /video-jobs/{job_id}, compliance timeline
+    at /video-jobs/{job_id}/timeline.
+    """
+    monitor = check_model_ready(model)
+    if video_jobs.active() >= settings.video_max_pending_jobs:
+        raise server_busy()
+    
+    if video is not None:
+        source, delete_after = await save_video_upload(video), True
+    elif path:
+        try:
+            source, delete_after = resolve_local_path(path), False
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        raise HTTPException(status_code=400, detail="No video or path provided")
+    
+    job = video_jobs.submit(VideoJob(
+        source,
+        confidence_threshold=confidence_threshold,
+        every_n=every_n,
+        target_fps=target_fps,
+        delete_after=delete_after,
+        monitor=monitor
+    ))
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"{router.prefix}/video-jobs/{job.id}",
+        "timeline_url": f"{router.prefix}/video-jobs/{job.id}/timeline"
+    }
+
+
+@router.get("/video-jobs")
+async def list_video_jobs():
+    """Progress of known video jobs"""
+    return {"jobs": video_jobs.list()}
+
+
+@router.get("/video-jobs/{job_id}")
+async def video_job_status(job_id: str):
+    """Progress of a video job, violation segments once it has samples"""
+    job = get_video_job(job_id)
+    return {**job.progress(), **job.summary()}
+
+
+@router.get("/video-jobs/{job_id}/timeline")
+async def video_job_timeline(
+    job_id: str,
+    offset: int = Query(0, ge=0, description="First timeline entry"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of entries")
+):
+    """Per-timestamp compliance of analyzed frames, partial while the job runs"""
+    job = get_video_job(job_id)
+    end = None if limit is None else offset + limit
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "total": len(job.timeline),
+        "offset": offset,
+        "timeline": job.timeline[offset:end]
+    }
+
+
+@router.delete("/video-jobs/{job_id}")
+async def cancel_video_job(job_id: str):
+    """Stop a video job, frames analyzed so far stay in the timeline"""
+    if video_jobs.cancel(job_id) is None:
+        raise HTTPException(status_code=404, detail="Video job not found")
+    return video_jobs.get(job_id).progress()
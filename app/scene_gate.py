@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import cv2
+import numpy as np
+from app.config import settings
+
+
+class GateEntry:
+    """Last inferred frame of a camera: thumbnail, result and skip counters"""
+
+    __slots__ = ('thumbnail', 'params', 'result', 'inferred_at', 'skipped_since',
+                 'frames', 'reused', 'forced')
+
+    def __init__(self):
+        self.thumbnail = None
+        self.params = None
+        self.result = None
+        self.inferred_at = 0.0
+        self.skipped_since = 0
+        self.frames = 0
+        self.reused = 0
+        self.forced = 0
+
+
+def thumbnail(image: np.ndarray, width: int) -> np.ndarray:
+    """
+    Downsampled grayscale frame for change detection. Nearest-neighbour
+    to 4x the size first: area averaging of a full frame costs milliseconds
+    """
+    height = max(1, round(image.shape[0] * width / image.shape[1]))
+    if image.shape[1] > 4 * width:
+        image = cv2.resize(image, (4 * width, 4 * height), interpolation=cv2.INTER_NEAREST)
+    small = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+
+def changed_share(a: np.ndarray, b: np.ndarray, pixel_delta: int) -> float:
+    """Share of thumbnail pixels that differ by more than pixel_delta levels"""
+    return float(np.count_nonzero(cv2.absdiff(a, b) > pixel_delta)) / a.size
+
+
+class SceneGate:
+    """
+    Skips inference on unchanged frames of fixed cameras. A frame is
+    compared with the last inferred frame of its camera (not the previous
+    one, so slow drift still triggers inference); under gate_threshold of
+    changed thumbnail pixels the stored result is reused. Inference is
+    forced after gate_max_skip_frames reused frames or gate_max_age_seconds.
+    """
+
+    def __init__(self, max_cameras: int = None):
+        self.max_cameras = max_cameras or settings.gate_max_cameras
+        self.cameras: "OrderedDict[str, GateEntry]" = OrderedDict()
+        self.frames = 0
+        self.reused = 0
+        self.forced = 0
+        self._lock = threading.Lock()
+
+    def check(self, camera_id: str, image: np.ndarray,
+              params: Tuple) -> Tuple[Optional[Dict[str, Any]], np.ndarray]:
+        """
+        Stored result if the frame is unchanged, else None. Returns the
+        thumbnail too, to be passed to store() after inference
+        """
+        small = thumbnail(image, settings.gate_width)
+        now = time.monotonic()
+        with self._lock:
+            entry = self.cameras.get(camera_id)
+            if entry is None:
+                entry = self.cameras[camera_id] = GateEntry()
+                if len(self.cameras) > self.max_cameras:
+                    self.cameras.popitem(last=False)
+            else:
+                self.cameras.move_to_end(camera_id)
+            entry.frames += 1
+            self.frames += 1
+
+            if entry.result is None or entry.params != params or entry.thumbnail.shape != small.shape:
+                return None, small
+            if changed_share(entry.thumbnail, small, settings.gate_pixel_delta) >= settings.gate_threshold:
+                return None, small
+            if (entry.skipped_since >= settings.gate_max_skip_frames
+                    or now - entry.inferred_at >= settings.gate_max_age_seconds):
+                entry.forced += 1
+                self.forced += 1
+                return None, small
+
+            entry.skipped_since += 1
+            entry.reused += 1
+            self.reused += 1
+            return {**entry.result, 'reused': True}, small
+
+    def store(self, camera_id: str, small: np.ndarray, params: Tuple, result: Dict[str, Any]):
+        """Remember an inferred frame as the new reference of the camera"""
+        with self._lock:
+            entry = self.cameras.get(camera_id)
+            if entry is None:
+                return
+            entry.thumbnail = small
+            entry.params = params
+            entry.result = dict(result)
+            entry.inferred_at = time.monotonic()
+            entry.skipped_since = 0
+
+    def last(self, camera_id: str, params: Tuple) -> Optional[Dict[str, Any]]:
+        """Last inferred result of the camera regardless of the frame, None if absent"""
+        with self._lock:
+            entry = self.cameras.get(camera_id)
+            if entry is None or entry.result is None or entry.params != params:
+                return None
+            entry.frames += 1
+            entry.reused += 1
+            self.frames += 1
+            self.reused += 1
+            return {**entry.result, 'reused': True}
+
+    def stats(self, camera_id: str = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if camera_id is not None:
+                entry = self.cameras.get(camera_id)
+                if entry is None:
+                    return None
+                frames, reused, forced = entry.frames, entry.reused, entry.forced
+            else:
+                frames, reused, forced = self.frames, self.reused, self.forced
+            return {
+                'enabled': settings.gate_enabled,
+                'cameras': len(self.cameras),
+                'frames': frames,
+                'reused': reused,
+                'forced': forced,
+                'skip_ratio': reused / frames if frames else 0.0
+            }
+
+
+scene_gate = SceneGate()
@@ -0,0 +1,78 @@
+from pydantic import BaseModel
+from typing import List, Optional, Dict, Any, Tuple
+
+class DetectionItem(BaseModel):
+    class_name: str
+    confidence: float
+    bbox: List[float]  # [x1, y1, x2, y2]
+
+class SafetyStatus(BaseModel):
+    person_detected: bool
+    has_helmet: bool
+    has_vest: bool
+    is_compliant: bool
+    violations: List[str]
+    persons_count: int
+    helmets_count: int
+    vests_count: int
+    no_helmets_count: int
+    no_vests_count: int
+
+class PersonStatus(BaseModel):
+    bbox: List[float]  # [x1, y1, x2, y2]
+    confidence: float
+    has_helmet: bool
+    has_vest: bool
+    is_compliant: bool
+    violations: List[str]
+    violation_boxes: List[List[float]]  # no-helmet / no-vest boxes of this person
+
+# Базовый ответ с JSON
+class DetectionResponse(BaseModel):
+    status: str
+    message: str
+    detections: List[DetectionItem]
+    safety_status: SafetyStatus
+    persons: Optional[List[PersonStatus]] = None
+    frame_size: Optional[Dict[str, int]] = None
+    inference_time: Optional[float] = None
+    model_version: Optional[str] = None
+    queue_depth: Optional[int] = None
+    queue_wait_time: Optional[float] = None
+    reused: Optional[bool] = None  # result of an earlier unchanged frame, with camera_id
+    temporal: Optional[Dict[str, Any]] = None  # debounced camera state, with camera_id
+    overload_level: Optional[int] = None  # degradation stages applied, 0 = none
+
+# Ответ с изображением в base64
+class DetectionResponseWithImage(BaseModel):
+    status: str
+    message: str
+    detections: List[DetectionItem]
+    safety_status: SafetyStatus
+    persons: Optional[List[PersonStatus]] = None
+    frame_size: Optional[Dict[str, int]] = None
+    inference_time: Optional[float] = None
+    model_version: Optional[str] = None
+    queue_depth: Optional[int] = None
+    queue_wait_time: Optional[float] = None
+    reused: Optional[bool] = None
+    temporal: Optional[Dict[str, Any]] = None
+    overload_level: Optional[int] = None
+    image_base64: Optional[str] = None  # Добавляем поле для изображения, None when annotation is skipped
+
+class ImageBase64(BaseModel):
+    image_base64: str
+    confidence_threshold: Optional[float] = 0.3
+    camera_id: Optional[str] = None
+    model: Optional[str] = None  # model name or version, default model if omitted
+
+class RegionsOfInterest(BaseModel):
+    # Fractions of frame width / height (0..1)
+    polygons: List[List[List[float]]] = []  # [[x, y], ...] per region
+    rectangles: List[Tuple[float, float, float, float]] = []  # [x1, y1, x2, y2] per region
+
+class HealthCheck(BaseModel):
+    status: str
+    version: str
+    model_loaded: bool
+    model_version: Optional[str] = None
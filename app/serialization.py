@@ -0,0 +1,79 @@
+import json
+from typing import Any, Dict, List, Optional
+from fastapi.responses import Response
+from app.metrics import timed
+
+try:
+    import orjson  # optional: pip install orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # optional: pip install msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+JSON_TYPES = ('application/json', 'application/*', '*/*')
+
+
+def dumps(data: Any) -> bytes:
+    """Compact JSON, orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def prefers_msgpack(accept: Optional[str]) -> bool:
+    """True if the Accept header ranks MessagePack at least as high as JSON and msgpack is installed"""
+    if not accept or msgpack is None:
+        return False
+    msgpack_q = json_q = 0.0
+    for media_range in accept.split(','):
+        media_type, *params = [part.strip() for part in media_range.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.lower()
+        if media_type in MSGPACK_TYPES:
+            msgpack_q = max(msgpack_q, q)
+        elif media_type in JSON_TYPES:
+            json_q = max(json_q, q)
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def columnar(detections: List[Dict[str, Any]], classes: List[str]) -> Dict[str, Any]:
+    """
+    Detections as parallel arrays: class_ids index into classes, bboxes is
+    flat x1, y1, x2, y2 per detection
+    """
+    class_index = {name: i for i, name in enumerate(classes)}
+    bboxes = []
+    for det in detections:
+        bboxes.extend(det['bbox'])
+    return {
+        'classes': classes,
+        'class_ids': [class_index.get(det['class_name'], -1) for det in detections],
+        'confidences': [det['confidence'] for det in detections],
+        'bboxes': bboxes
+    }
+
+
+@timed('serialize')
+def fast_response(data: Dict[str, Any], accept: Optional[str] = None, layout: str = 'rows',
+                  classes: List[str] = None) -> Response:
+    """
+    Response of trusted result fields without pydantic validation: JSON, or
+    MessagePack when the Accept header asks for it. layout='columnar'
+    replaces the detections list by columnar()
+    """
+    if layout == 'columnar':
+        data = {**data, 'detections': columnar(data['detections'], classes)}
+    headers = {'Vary': 'Accept'}
+    if prefers_msgpack(accept):
+        return Response(content=msgpack.packb(data), media_type='application/msgpack', headers=headers)
+    return Response(content=dumps(data), media_type='application/json', headers=headers)
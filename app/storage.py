@@ -0,0 +1,243 @@
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Union
+from app.config import settings
+
+# Stored result names: blake2b digest of the file contents + extension
+RESULT_NAME = re.compile(r"^([0-9a-f]{32})\.jpg$")
+
+
+class ResultStore:
+    """
+    Content-addressed storage of annotated result images.
+
+    Files live in root/<2 hex>/<2 hex>/<digest>.jpg and are written by a
+    background thread from a bounded queue, so the request path only
+    encodes and hashes. Until written a result is served from memory.
+    Entries are kept in least recently used order, the oldest ones are
+    removed when total size exceeds max_bytes or when they were not
+    stored or fetched for max_age_seconds.
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = None,
+                 max_age_seconds: float = None, queue_size: int = None):
+        self.root = root or settings.storage_dir
+        self.max_bytes = max_bytes or settings.storage_max_bytes
+        self.max_age = max_age_seconds or settings.storage_max_age_seconds
+        self._queue = queue.Queue(maxsize=queue_size or settings.storage_queue_size)
+        self._entries = OrderedDict()  # digest -> (size, last_access)
+        self._pending = {}  # digest -> bytes not yet on disk
+        self._lock = threading.Lock()
+        # Orders file replace / remove of the same digest
+        self._io_lock = threading.Lock()
+        self._thread = None
+        self._loaded = False
+        self.current_bytes = 0
+        self.writes = 0
+        self.sync_writes = 0
+        self.duplicates = 0
+        self.evictions = 0
+        self.expired = 0
+        self.write_errors = 0
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.jpg")
+
+    def start(self):
+        """Start writer thread, it indexes files left from previous runs first"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Write what is still queued and stop the writer thread"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join()
+        self._thread = None
+
+    def put(self, data: bytes) -> str:
+        """
+        Store encoded image, returns its file name. The name can be fetched
+        right away; when the write queue is full the caller writes itself
+        """
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        with self._lock:
+            if digest in self._entries:
+                # Same annotated image already stored: refresh only
+                self._entries[digest] = (self._entries[digest][0], time.time())
+                self._entries.move_to_end(digest)
+                self.duplicates += 1
+                return f"{digest}.jpg"
+            self._entries[digest] = (len(data), time.time())
+            self._pending[digest] = data
+            self.current_bytes += len(data)
+
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(digest)
+        except queue.Full:
+            # Disk is behind: back-pressure on this worker instead of an
+            # unbounded queue of images in memory
+            with self._lock:
+                self.sync_writes += 1
+            self._write(digest)
+        return f"{digest}.jpg"
+
+    def get(self, name: str) -> Optional[Union[bytes, str]]:
+        """Image bytes while pending, file path when written, None if unknown or evicted"""
+        match = RESULT_NAME.match(name)
+        if match is None:
+            return None
+        digest = match.group(1)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries[digest] = (entry[0], time.time())
+                self._entries.move_to_end(digest)
+                data = self._pending.get(digest)
+                if data is not None:
+                    return data
+            elif self._loaded:
+                return None
+        # Not indexed yet right after start: look on disk
+        path = self.path_for(digest)
+        return path if entry is not None or os.path.exists(path) else None
+
+    def _write(self, digest: str):
+        with self._lock:
+            data = self._pending.get(digest)
+        if data is None:
+            return
+        path = self.path_for(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Readers never see a partial file
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            with self._io_lock:
+                os.replace(tmp_path, path)
+            with self._lock:
+                self.writes += 1
+        except OSError as e:
+            print(f"Error writing result {digest}: {e}")
+            with self._lock:
+                self.write_errors += 1
+                if digest in self._entries:
+                    self._remove(digest)
+        finally:
+            with self._lock:
+                self._pending.pop(digest, None)
+        self._evict()
+
+    def _run(self):
+        self._load_index()
+        while True:
+            try:
+                digest = self._queue.get(timeout=60)
+            except queue.Empty:
+                # Idle: expire old results anyway
+                self._evict()
+                continue
+            if digest is None:
+                break
+            self._write(digest)
+
+    def _load_index(self):
+        """Index files of previous runs, modification time as last access"""
+        found = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                match = RESULT_NAME.match(filename)
+                if match is None:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, filename))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, match.group(1), stat.st_size))
+        found.sort()
+
+        with self._lock:
+            # Results stored since start are newer than anything on disk
+            newer = list(self._entries.items())
+            self._entries.clear()
+            self.current_bytes = 0
+            for mtime, digest, size in found:
+                self._entries[digest] = (size, mtime)
+                self.current_bytes += size
+            for digest, entry in newer:
+                if digest in self._entries:
+                    self._remove(digest)
+                self._entries[digest] = entry
+                self.current_bytes += entry[0]
+            self._loaded = True
+        self._evict()
+
+    def _evict(self):
+        """Remove least recently used results over the size or age limit"""
+        removed = []
+        with self._lock:
+            expires_before = time.time() - self.max_age
+            while self._entries:
+                digest, (size, last_access) = next(iter(self._entries.items()))
+                if digest in self._pending:
+                    # Not on disk yet; goes when written if still over limit
+                    break
+                if self.current_bytes > self.max_bytes:
+                    self.evictions += 1
+                elif last_access < expires_before:
+                    self.expired += 1
+                else:
+                    break
+                self._remove(digest)
+                removed.append(digest)
+
+        for digest in removed:
+            with self._io_lock:
+                # Stored again since: the file belongs to the new entry
+                with self._lock:
+                    if digest in self._entries:
+                        continue
+                try:
+                    os.remove(self.path_for(digest))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Error removing result {digest}: {e}")
+
+    def _remove(self, digest: str):
+        size, _ = self._entries.pop(digest)
+        self.current_bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'max_age_seconds': self.max_age,
+                'pending': len(self._pending),
+                'queue_size': self._queue.qsize(),
+                'writes': self.writes,
+                'sync_writes': self.sync_writes,
+                'duplicates': self.duplicates,
+                'evictions': self.evictions,
+                'expired': self.expired,
+                'write_errors': self.write_errors,
+                'indexed': self._loaded
+            }
+
+
+result_store = ResultStore()
@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+from app.config import settings
+
+# Violation signals, one bit each in the ring buffer
+VIOLATION_TYPES = ('No helmet', 'No vest')
+VIOLATION_BITS = {name: 1 << i for i, name in enumerate(VIOLATION_TYPES)}
+
+
+class CameraState:
+    """
+    Sliding window of the last `window` frames of one camera as a ring of
+    violation bit masks plus a running count per violation type. An update
+    replaces the oldest mask and adjusts the counts, memory is fixed.
+    """
+
+    __slots__ = ('ring', 'position', 'frames', 'counts', 'active', 'changed_at', 'updated_at')
+
+    def __init__(self, window: int):
+        self.ring = bytearray(window)
+        self.position = 0
+        self.frames = 0
+        self.counts = [0] * len(VIOLATION_TYPES)
+        self.active = 0
+        self.changed_at = None
+        self.updated_at = None
+
+    def update(self, mask: int, on_frames: int, off_frames: int) -> int:
+        """Add one frame, returns the debounced violation mask"""
+        old = self.ring[self.position]
+        self.ring[self.position] = mask
+        self.position = (self.position + 1) % len(self.ring)
+        self.frames += 1
+
+        changed = old ^ mask
+        for i in range(len(VIOLATION_TYPES)):
+            bit = 1 << i
+            if changed & bit:
+                self.counts[i] += 1 if mask & bit else -1
+            # Hysteresis: on at on_frames, off only at off_frames or fewer
+            if self.counts[i] >= on_frames:
+                self.active |= bit
+            elif self.counts[i] <= off_frames:
+                self.active &= ~bit
+        return self.active
+
+
+def violation_names(mask: int) -> List[str]:
+    return [name for name in VIOLATION_TYPES if mask & VIOLATION_BITS[name]]
+
+
+class TemporalCompliance:
+    """
+    Debounced compliance per camera. A violation type turns on when it is
+    seen in temporal_on_frames of the last temporal_window frames of the
+    camera and off once it is in temporal_off_frames or fewer, so single
+    missed detections do not flip the state. Only state changes become
+    events, kept in a bounded buffer for polling by alerting.
+
+    Least recently updated cameras are dropped over temporal_max_cameras.
+    """
+
+    def __init__(self, window: int = None, on_frames: int = None, off_frames: int = None,
+                 max_cameras: int = None, max_events: int = None):
+        self.window = window or settings.temporal_window
+        self.on_frames = min(self.window, on_frames or settings.temporal_on_frames)
+        self.off_frames = min(self.on_frames - 1, settings.temporal_off_frames if off_frames is None else off_frames)
+        self.max_cameras = max_cameras or settings.temporal_max_cameras
+        self.cameras: "OrderedDict[str, CameraState]" = OrderedDict()
+        self.events = deque(maxlen=max_events or settings.temporal_event_buffer)
+        self.sequence = 0
+        self.frames = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def update(self, camera_id: str, safety_status: Dict[str, Any],
+               timestamp: float = None) -> Dict[str, Any]:
+        """Add a frame result of the camera, returns its debounced state and the event if it changed"""
+        if timestamp is None:
+            timestamp = time.time()
+        mask = 0
+        for name in safety_status['violations']:
+            mask |= VIOLATION_BITS.get(name, 0)
+
+        with self._lock:
+            state = self.cameras.get(camera_id)
+            if state is None:
+                state = self.cameras[camera_id] = CameraState(self.window)
+                if len(self.cameras) > self.max_cameras:
+                    self.cameras.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self.cameras.move_to_end(camera_id)
+            self.frames += 1
+
+            previous = state.active
+            active = state.update(mask, self.on_frames, self.off_frames)
+            state.updated_at = timestamp
+            event = None
+            if active != previous:
+                state.changed_at = timestamp
+                self.sequence += 1
+                event = {
+                    'seq': self.sequence,
+                    'camera_id': camera_id,
+                    'timestamp': timestamp,
+                    'compliant': active == 0,
+                    'violations': violation_names(active),
+                    'started': violation_names(active & ~previous),
+                    'ended': violation_names(previous & ~active)
+                }
+                self.events.append(event)
+            return {**self._describe(camera_id, state), 'event': event}
+
+    def state(self, camera_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self.cameras.get(camera_id)
+            return None if state is None else self._describe(camera_id, state)
+
+    def events_since(self, since: int = 0, camera_id: str = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Buffered events with seq > since, oldest first"""
+        with self._lock:
+            events = list(self.events)
+        # seq grows by one per event, skip straight to the first newer one
+        if events:
+            events = events[max(0, since - events[0]['seq'] + 1):]
+        if camera_id is not None:
+            events = [event for event in events if event['camera_id'] == camera_id]
+        return events[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'cameras': len(self.cameras),
+                'max_cameras': self.max_cameras,
+                'evicted': self.evicted,
+                'frames': self.frames,
+                'events': self.sequence,
+                'buffered_events': len(self.events),
+                'window': self.window,
+                'on_frames': self.on_frames,
+                'off_frames': self.off_frames
+            }
+
+    def _describe(self, camera_id: str, state: CameraState) -> Dict[str, Any]:
+        return {
+            'camera_id': camera_id,
+            'compliant': state.active == 0,
+            'violations': violation_names(state.active),
+            'window_counts': dict(zip(VIOLATION_TYPES, state.counts)),
+            'window_frames': min(state.frames, self.window),
+            'changed_at': state.changed_at
+        }
+
+
+temporal_compliance = TemporalCompliance()
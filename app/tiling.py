@@ -0,0 +1,78 @@
+import math
+import numpy as np
+from typing import List, Tuple
+from app.association import box_containment, box_iou
+
+
+def axis_starts(length: int, tile: int, overlap: float) -> List[int]:
+    """Tile offsets along one axis, spread evenly so that the last tile ends at the border"""
+    if length <= tile:
+        return [0]
+    step = max(1, int(tile * (1 - overlap)))
+    count = math.ceil((length - tile) / step) + 1
+    return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: float,
+              max_tiles: int) -> List[Tuple[int, int, int, int]]:
+    """
+    (x1, y1, x2, y2) of overlapping square tiles covering the image, all of
+    the same size so that they batch together. Tiles grow when more than
+    max_tiles would be needed.
+    """
+    size = tile_size
+    while True:
+        tile_width, tile_height = min(size, width), min(size, height)
+        xs = axis_starts(width, tile_width, overlap)
+        ys = axis_starts(height, tile_height, overlap)
+        if len(xs) * len(ys) <= max(1, max_tiles):
+            break
+        size = int(size * 1.25) + 1
+    return [(x, y, x + tile_width, y + tile_height) for y in ys for x in xs]
+
+
+def merge_tile_detections(class_ids: np.ndarray, confidences: np.ndarray, xyxy: np.ndarray,
+                          tile_ids: np.ndarray, iou_threshold: float = 0.5,
+                          containment_threshold: float = 0.8):
+    """
+    Greedy merge of boxes found on different tiles. A box duplicates a
+    higher-confidence box of the same class from another tile if their IoU
+    or the share of either inside the other is over the threshold; the
+    kept box grows to the union, which restores objects cut by tile borders.
+    Boxes of the same tile were already suppressed by the model.
+    """
+    if len(xyxy) == 0:
+        return class_ids, confidences, xyxy
+
+    xyxy = xyxy.astype(np.float32)
+    containment = box_containment(xyxy, xyxy)
+    duplicate = (
+        (class_ids[:, None] == class_ids[None, :])
+        & (tile_ids[:, None] != tile_ids[None, :])
+        & (
+            (box_iou(xyxy, xyxy) > iou_threshold)
+            | (containment > containment_threshold)
+            | (containment.T > containment_threshold)
+        )
+    )
+
+    order = np.argsort(-confidences, kind='stable')
+    suppressed = np.zeros(len(xyxy), dtype=bool)
+    keep, merged_boxes = [], []
+    for i in order:
+        if suppressed[i]:
+            continue
+        group = duplicate[i] & ~suppressed
+        suppressed |= group
+        suppressed[i] = True
+        keep.append(i)
+
+        box = xyxy[i].copy()
+        if group.any():
+            members = xyxy[group]
+            box[:2] = np.minimum(box[:2], members[:, :2].min(axis=0))
+            box[2:] = np.maximum(box[2:], members[:, 2:].max(axis=0))
+        merged_boxes.append(box)
+
+    keep = np.array(keep, dtype=np.int64)
+    return class_ids[keep], confidences[keep], np.array(merged_boxes, dtype=np.float32)
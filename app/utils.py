@@ -4,6 +4,36 @@ import cv2
 from io import BytesIO
 from PIL import Image
 import json
+from functools import lru_cache
+from typing import Optional, Tuple
+from app.metrics import timed
+
+# JPEG start-of-frame markers, they carry image size
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+ENCODE_FORMATS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 'image/jpeg'),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 'image/webp'),
+}
+
+DETECTION_COLORS = {
+    'person': (0, 255, 0),      # green
+    'helmet': (255, 0, 0),      # blue
+    'vest': (0, 0, 255),        # red
+    'no-helmet': (0, 255, 255), # yellow
+    'no-vest': (255, 0, 255)    # perple
+}
+
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_SCALE = 0.5
+LABEL_THICKNESS = 2
+
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
 
 def base64_to_image(image_base64: str) -> np.ndarray:
     """Conversation base64 to numpy array"""
@@ -28,6 +58,104 @@ def base64_to_image(image_base64: str) -> np.ndarray:
     except Exception as e:
         raise ValueError(f"Error converting base64 to image: {e}")
 
+def read_jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from JPEG header without decoding, None if not a JPEG"""
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        # Padding and markers without payload
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    return None
+
+
+def choose_decode_scale(width: int, height: int, target_size: int) -> int:
+    """Largest JPEG DCT scale that keeps the longer side >= target_size"""
+    for scale in (8, 4, 2):
+        if max(width, height) // scale >= target_size:
+            return scale
+    return 1
+
+
+@timed('decode')
+def decode_image_bytes(data: bytes, target_size: Optional[int] = None):
+    """
+    Decode image bytes, JPEGs larger than needed are decoded at 1/2, 1/4 or 1/8.
+    Returns (image or None, original width, original height)
+    """
+    nparr = np.frombuffer(data, np.uint8)
+    
+    size = read_jpeg_size(data) if target_size else None
+    scale = choose_decode_scale(size[0], size[1], target_size) if size else 1
+    image = cv2.imdecode(nparr, REDUCED_DECODE_FLAGS[scale])
+    if image is None:
+        return None, 0, 0
+    if scale == 1:
+        return image, image.shape[1], image.shape[0]
+    
+    width, height = size
+    # EXIF orientation may have rotated the decoded frame
+    if (image.shape[1] >= image.shape[0]) != (width >= height):
+        width, height = height, width
+    return image, width, height
+
+
+def rescale_detections(detections: list, scale_x: float, scale_y: float) -> list:
+    """Detections with bbox coordinates multiplied by scale"""
+    if scale_x == 1 and scale_y == 1:
+        return detections
+    return [
+        {**det, 'bbox': rescale_box(det['bbox'], scale_x, scale_y)}
+        for det in detections
+    ]
+
+
+def rescale_box(bbox: list, scale_x: float, scale_y: float) -> list:
+    x1, y1, x2, y2 = bbox
+    return [x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y]
+
+
+def rescale_result(result: dict, width: int, height: int) -> dict:
+    """Map result of a reduced frame back to original frame coordinates"""
+    frame_size = result['frame_size']
+    scale_x = width / frame_size['width']
+    scale_y = height / frame_size['height']
+    if scale_x == 1 and scale_y == 1:
+        return result
+    
+    rescaled = dict(result)
+    rescaled['frame_size'] = {**frame_size, 'width': width, 'height': height}
+    if result.get('detections') is not None:
+        rescaled['detections'] = rescale_detections(result['detections'], scale_x, scale_y)
+    if result.get('persons') is not None:
+        rescaled['persons'] = [
+            {
+                **person,
+                'bbox': rescale_box(person['bbox'], scale_x, scale_y),
+                'violation_boxes': [
+                    rescale_box(bbox, scale_x, scale_y) for bbox in person['violation_boxes']
+                ]
+            }
+            for person in result['persons']
+        ]
+    return rescaled
+
+
+@timed('encode')
 def image_to_base64(image: np.ndarray) -> str:
     """Confersation numpy array to base64"""
     try:
@@ -45,19 +173,84 @@ def image_to_base64(image: np.ndarray) -> str:
     except Exception as e:
         raise ValueError(f"Error converting image to base64: {e}")
 
-def draw_detections(image: np.ndarray, detections: list, safety_status: dict) -> np.ndarray:
-    """Rendering detections on an image"""
-    # Copying image
-    image_with_boxes = image.copy()
+@timed('encode')
+def encode_image(image: np.ndarray, image_format: str = 'jpeg', quality: int = 85,
+                 max_width: Optional[int] = None) -> bytes:
+    """Encode BGR image to JPEG / WebP bytes, downscaled to max_width if wider"""
+    if max_width and image.shape[1] > max_width:
+        height = max(1, round(image.shape[0] * max_width / image.shape[1]))
+        image = cv2.resize(image, (max_width, height), interpolation=cv2.INTER_AREA)
     
+    # cv2.imencode expects BGR, no color conversion needed
+    extension, quality_flag, _ = ENCODE_FORMATS[image_format]
+    ok, buffer = cv2.imencode(extension, image, [quality_flag, int(quality)])
+    if not ok:
+        raise ValueError(f"Error encoding image to {image_format}")
+    return buffer.tobytes()
+
+@lru_cache(maxsize=2048)
+def label_glyph(text: str):
+    """
+    Pre-rendered label coverage (0-255) and its offset from the text origin.
+    Labels are "<class>: <conf:.2f>", so the cache holds one entry per
+    class and confidence bucket of 0.01
+    """
+    (width, height), baseline = cv2.getTextSize(text, LABEL_FONT, LABEL_SCALE, LABEL_THICKNESS)
+    pad = 2 * LABEL_THICKNESS + 4
+    canvas = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype=np.uint8)
+    cv2.putText(canvas, text, (pad, pad + height), LABEL_FONT, LABEL_SCALE, 255, LABEL_THICKNESS)
     
-    colors = {
-        'person': (0, 255, 0),      # green
-        'helmet': (255, 0, 0),      # blue
-        'vest': (0, 0, 255),        # red
-        'no-helmet': (0, 255, 255), # yellow
-        'no-vest': (255, 0, 255)    # perple
-    }
+    ys, xs = np.nonzero(canvas)
+    if len(xs) == 0:
+        return np.zeros((0, 0), dtype=np.uint8), 0, 0, (ys, xs)
+    y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+    alpha = canvas[y0:y1, x0:x1]
+    # OpenCV 4 draws Hershey text without anti-aliasing: pixel indices are
+    # enough to paint it, anti-aliased glyphs (OpenCV 5) are alpha blended
+    pixels = np.nonzero(alpha) if np.isin(alpha, (0, 255)).all() else None
+    return alpha, int(x0 - pad), int(y0 - pad - height), pixels
+
+
+def put_label(image: np.ndarray, text: str, origin: tuple, color: tuple):
+    """Same result as cv2.putText(image, text, origin, LABEL_FONT, ...) from cached glyph"""
+    alpha, dx, dy, pixels = label_glyph(text)
+    x0, y0 = origin[0] + dx, origin[1] + dy
+    height, width = alpha.shape
+    
+    # Labels crossing the border: OpenCV clips thick strokes slightly differently
+    if x0 < 0 or y0 < 0 or x0 + width > image.shape[1] or y0 + height > image.shape[0]:
+        cv2.putText(image, text, origin, LABEL_FONT, LABEL_SCALE, color, LABEL_THICKNESS)
+        return
+    region = image[y0:y0 + height, x0:x0 + width]
+    
+    if pixels is not None:
+        region[pixels] = color
+    else:
+        weight = alpha[..., None].astype(np.uint16)
+        blended = (region * (255 - weight) + np.array(color, dtype=np.uint16) * weight + 127) // 255
+        region[...] = blended.astype(np.uint8)
+
+
+@timed('draw')
+def draw_detections(image: np.ndarray, detections: list, safety_status: dict,
+                    in_place: bool = False, preview_width: Optional[int] = None) -> np.ndarray:
+    """
+    Rendering detections on an image
+    
+    - in_place: draw on the given image instead of a copy (caller no longer needs it)
+    - preview_width: draw on a downscaled copy of this width if image is wider
+    """
+    scale = 1.0
+    if preview_width and image.shape[1] > preview_width:
+        # Downscaled preview, boxes are scaled to it
+        scale = preview_width / image.shape[1]
+        height = max(1, round(image.shape[0] * scale))
+        image_with_boxes = cv2.resize(image, (preview_width, height), interpolation=cv2.INTER_AREA)
+    elif in_place:
+        image_with_boxes = image
+    else:
+        # Copying image
+        image_with_boxes = image.copy()
     
     # bounding boxes
     for det in detections:
@@ -65,16 +258,15 @@ def draw_detections(image: np.ndarray, detections: list, safety_status: dict) ->
         confidence = det['confidence']
         bbox = det['bbox']
         
-        color = colors.get(class_name, (255, 255, 255))
+        color = DETECTION_COLORS.get(class_name, (255, 255, 255))
         
         
-        x1, y1, x2, y2 = map(int, bbox)
+        x1, y1, x2, y2 = map(int, bbox if scale == 1.0 else [v * scale for v in bbox])
         cv2.rectangle(image_with_boxes, (x1, y1), (x2, y2), color, 2)
         
         
         label = f"{class_name}: {confidence:.2f}"
-        cv2.putText(image_with_boxes, label, (x1, y1 - 10),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        put_label(image_with_boxes, label, (x1, y1 - 10), color)
     
     y_offset = 30
     
@@ -0,0 +1,270 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import cv2
+from app.config import settings
+
+# Job states
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class VideoJob:
+    """Analysis of one video file: progress counters and compliance timeline"""
+
+    def __init__(self, path: str, confidence_threshold: Optional[float] = None,
+                 every_n: int = 1, target_fps: Optional[float] = None,
+                 delete_after: bool = False, monitor=None):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.confidence_threshold = confidence_threshold
+        self.every_n = max(1, every_n)
+        self.target_fps = target_fps
+        self.delete_after = delete_after
+        self.monitor = monitor
+        self.status = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.fps = 0.0
+        self.total_frames = 0
+        self.frames_decoded = 0
+        self.frames_sampled = 0
+        self.frames_inferred = 0
+        self.timeline: List[Dict[str, Any]] = []
+        self.cancel_event = threading.Event()
+
+    def progress(self) -> Dict[str, Any]:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'model_version': self.monitor.model_version if self.monitor is not None else None,
+            'fps': self.fps,
+            'total_frames': self.total_frames,
+            'frames_decoded': self.frames_decoded,
+            'frames_sampled': self.frames_sampled,
+            'frames_inferred': self.frames_inferred,
+            'progress': min(1.0, self.frames_decoded / self.total_frames) if self.total_frames else None,
+            'elapsed': elapsed,
+            'inferred_per_second': self.frames_inferred / elapsed if elapsed > 0 else 0.0,
+            'video_seconds': self.total_frames / self.fps if self.fps else None,
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Violation segments: runs of consecutive non-compliant samples"""
+        segments = []
+        previous_violation = False
+        for entry in self.timeline:
+            violation = entry['person_detected'] and not entry['is_compliant']
+            if violation and previous_violation:
+                segment = segments[-1]
+                segment['end'] = entry['timestamp']
+                segment['violations'] = sorted(set(segment['violations']) | set(entry['violations']))
+            elif violation:
+                segments.append({
+                    'start': entry['timestamp'],
+                    'end': entry['timestamp'],
+                    'violations': list(entry['violations'])
+                })
+            previous_violation = violation
+
+        return {
+            'samples': len(self.timeline),
+            'violation_samples': sum(
+                1 for entry in self.timeline if entry['person_detected'] and not entry['is_compliant']
+            ),
+            'segments': segments
+        }
+
+
+def resolve_local_path(path: str) -> str:
+    """Absolute path of a video under video_local_root, ValueError outside of it"""
+    root = os.path.realpath(settings.video_local_root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError("Path must be inside the video directory")
+    if not os.path.isfile(resolved):
+        raise ValueError("Video file not found")
+    return resolved
+
+
+class VideoJobManager:
+    """
+    Runs video jobs in the background, at most video_max_jobs at a time.
+
+    Per job a decode thread reads and samples frames (every Nth frame or
+    target FPS) into a bounded queue while the job thread keeps up to
+    batch_max_size frames submitted to SafetyMonitor, so decoding overlaps
+    inference and sampled frames of a job share model batches.
+    """
+
+    def __init__(self, max_jobs: int = None, max_finished: int = None):
+        self.max_jobs = max_jobs or settings.video_max_jobs
+        self.max_finished = max_finished or settings.video_max_finished_jobs
+        self.jobs: "OrderedDict[str, VideoJob]" = OrderedDict()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="video-job")
+        return self._pool
+
+    def submit(self, job: VideoJob) -> VideoJob:
+        with self._lock:
+            self.jobs[job.id] = job
+            self._forget_finished()
+            pool = self._get_pool()
+        pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[VideoJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [job.progress() for job in self.jobs.values()]
+
+    def active(self) -> int:
+        """Queued and running jobs"""
+        with self._lock:
+            return sum(1 for job in self.jobs.values() if job.status not in FINISHED_STATES)
+
+    def cancel(self, job_id: str) -> Optional[VideoJob]:
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                job.status = CANCELLED
+        return job
+
+    def shutdown(self):
+        with self._lock:
+            for job in self.jobs.values():
+                job.cancel_event.set()
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def _forget_finished(self):
+        """Keep only the newest max_finished finished jobs"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def _run(self, job: VideoJob):
+        from app.models import safety_monitor
+
+        monitor = job.monitor = job.monitor or safety_monitor
+        if job.status == CANCELLED:
+            self._cleanup(job)
+            return
+        job.started_at = time.time()
+        job.status = RUNNING
+        frames = queue.Queue(maxsize=settings.video_queue_frames)
+        capture = cv2.VideoCapture(job.path)
+        decoder = None
+        try:
+            if not capture.isOpened():
+                raise ValueError(f"Cannot open video: {os.path.basename(job.path)}")
+            job.fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+            job.total_frames = max(0, int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+
+            decoder = threading.Thread(
+                target=self._decode, args=(job, capture, frames), name="video-decode", daemon=True
+            )
+            decoder.start()
+
+            in_flight = deque()
+            while True:
+                item = frames.get()
+                if item is not None:
+                    index, timestamp, frame = item
+                    in_flight.append((index, timestamp, monitor.submit(
+                        frame, job.confidence_threshold, with_detections=False
+                    )))
+                # Collect in order: oldest when enough are in flight, all at the end
+                while in_flight and (item is None or len(in_flight) >= settings.batch_max_size):
+                    index, timestamp, future = in_flight.popleft()
+                    result = future.result()
+                    status = result['safety_status']
+                    job.timeline.append({
+                        'frame': index,
+                        'timestamp': round(timestamp, 3),
+                        'person_detected': status['person_detected'],
+                        'is_compliant': status['is_compliant'],
+                        'violations': status['violations'],
+                        'persons_count': status['persons_count'],
+                        'helmets_count': status['helmets_count'],
+                        'vests_count': status['vests_count']
+                    })
+                    job.frames_inferred += 1
+                if item is None:
+                    break
+
+            job.status = CANCELLED if job.cancel_event.is_set() else COMPLETED
+        except Exception as e:
+            job.cancel_event.set()
+            job.error = str(e)
+            job.status = FAILED
+            print(f"Video job {job.id} failed: {e}")
+        finally:
+            if decoder is not None:
+                # Unblock the decoder if it waits on a full queue
+                while decoder.is_alive():
+                    try:
+                        frames.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+            capture.release()
+            self._cleanup(job)
+
+    @staticmethod
+    def _cleanup(job: VideoJob):
+        job.finished_at = time.time()
+        if job.delete_after:
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _decode(job: VideoJob, capture, frames: queue.Queue):
+        """Read frames, only sampled ones are converted and queued; None marks the end"""
+        step = 1.0 / job.target_fps if job.target_fps else None
+        next_time = 0.0
+        index = -1
+        try:
+            while not job.cancel_event.is_set():
+                if not capture.grab():
+                    break
+                index += 1
+                job.frames_decoded += 1
+                timestamp = index / job.fps if job.fps else capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+
+                if step is not None:
+                    if timestamp + 1e-6 < next_time:
+                        continue
+                    next_time += step * max(1, int((timestamp - next_time) / step) + 1)
+                elif index % job.every_n:
+                    continue
+
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                job.frames_sampled += 1
+                frames.put((index, timestamp, frame))
+        finally:
+            frames.put(None)
+
+
+video_jobs = VideoJobManager()
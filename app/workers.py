@@ -0,0 +1,307 @@
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Dict, Optional
+import numpy as np
+from app.config import settings
+
+# Task id of "worker loaded and warmed up" message
+READY_MESSAGE = -1
+
+
+def _attach(buffer, slots, shape, dtype) -> np.ndarray:
+    """Frame for a task buffer: slot index or name of a one-off block"""
+    if isinstance(buffer, int):
+        return np.ndarray(shape, dtype=dtype, buffer=slots[buffer].buf)
+
+    # Oversized frame in its own block: copy out so that the block can be
+    # closed right away, ultralytics keeps references to input images
+    shm = shared_memory.SharedMemory(name=buffer)
+    frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    shm.close()
+    return frame
+
+
+def _worker_main(task_conn, result_conn, slot_names, torch_threads):
+    """Inference process: own model, frames come through shared memory"""
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        # Stub engine for load tests runs without torch
+        pass
+
+    from app.models import SafetyMonitor
+    monitor = SafetyMonitor()
+    monitor.warmup()
+    result_conn.send((READY_MESSAGE, monitor.timings, monitor.load_error))
+
+    # Slots stay mapped for the whole life of the worker
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+
+    stopping = False
+    while not stopping:
+        task = task_conn.recv()
+        if task is None:
+            break
+
+        # Take whatever else is already waiting, up to one batch
+        tasks = [task]
+        while len(tasks) < settings.batch_max_size and task_conn.poll():
+            task = task_conn.recv()
+            if task is None:
+                stopping = True
+                break
+            tasks.append(task)
+
+        groups = {}
+        for task_id, buffer, shape, dtype, options in tasks:
+            groups.setdefault(options, []).append((task_id, buffer, shape, dtype))
+
+        for (confidence_threshold, with_detections, imgsz), items in groups.items():
+            try:
+                frames = [_attach(buffer, slots, shape, dtype) for _, buffer, shape, dtype in items]
+                results = monitor.predict_batch(frames, confidence_threshold, with_detections, imgsz)
+                for (task_id, *_), result in zip(items, results):
+                    result_conn.send((task_id, result, None))
+            except Exception as e:
+                for task_id, *_ in items:
+                    result_conn.send((task_id, None, f"{type(e).__name__}: {e}"))
+            frames = None
+
+    for shm in slots:
+        try:
+            shm.close()
+        except BufferError:
+            # Model still holds a view of the last frame
+            pass
+
+
+class Worker:
+    """One inference process with its own task and result pipes"""
+
+    def __init__(self, ctx, index: int, slot_names, torch_threads: int):
+        self.index = index
+        task_recv, self.task_conn = ctx.Pipe(duplex=False)
+        self.result_conn, result_send = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(task_recv, result_send, slot_names, torch_threads),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        self.process.start()
+        # The child's ends: closed here so that a dead worker shows as EOF
+        task_recv.close()
+        result_send.close()
+        self.in_flight = 0
+        self.send_lock = threading.Lock()
+
+    def send(self, task) -> bool:
+        try:
+            with self.send_lock:
+                self.task_conn.send(task)
+            return True
+        except OSError:
+            # Worker died, its tasks are failed by the collector
+            return False
+
+
+class InferencePool:
+    """
+    N inference processes, each with its own model.
+    Decoded frames are handed over through shared memory, not pickled.
+    Every worker has its own task and result pipe (a shared queue stays
+    locked forever if a worker dies holding its lock) and tasks go to the
+    worker with the fewest in flight. A worker that dies (OOM, segfault)
+    is replaced and the tasks sent to it fail with RuntimeError.
+    """
+
+    def __init__(self, num_workers: int = None, torch_threads: int = None,
+                 slot_bytes: int = None):
+        self.num_workers = num_workers or settings.inference_workers
+        self.torch_threads = torch_threads or settings.inference_torch_threads
+        self.slot_bytes = slot_bytes or settings.inference_slot_bytes
+        self._workers = []
+        self._slots = []
+        self._free_slots = queue.Queue()
+        self._pending: Dict[int, tuple] = {}  # task id -> (future, slot, shm, worker)
+        self.worker_timings = []
+        self.worker_errors = []
+        self.restarts = 0
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._ctx = None
+        self._wakeup = None
+        self._collector = None
+
+    def start(self):
+        """Create shared memory slots and start worker processes"""
+        self._ctx = mp.get_context("spawn")
+        self._stopping = False
+
+        # Two slots per worker: one being inferred, one being filled
+        for index in range(self.num_workers * 2):
+            self._slots.append(shared_memory.SharedMemory(create=True, size=self.slot_bytes))
+            self._free_slots.put(index)
+
+        self._workers = [self._spawn(i) for i in range(self.num_workers)]
+        self._wakeup = self._ctx.Pipe(duplex=False)
+
+        self._collector = threading.Thread(target=self._collect, name="inference-collector", daemon=True)
+        self._collector.start()
+        print(f"Started {self.num_workers} inference workers, {self.torch_threads} torch threads each")
+
+    def _spawn(self, index: int) -> Worker:
+        return Worker(self._ctx, index, [shm.name for shm in self._slots], self.torch_threads)
+
+    def is_running(self) -> bool:
+        return any(worker.process.is_alive() for worker in self._workers)
+
+    def is_ready(self) -> bool:
+        """All workers loaded and warmed up their models"""
+        return (
+            len(self.worker_timings) >= self.num_workers
+            and not self.worker_errors
+            and self.is_running()
+        )
+
+    def submit(self, image: np.ndarray, confidence_threshold: float,
+               with_detections: bool = True, imgsz: int = None) -> Future:
+        """Copy frame to shared memory and send it to the least busy worker"""
+        future = Future()
+        image = np.ascontiguousarray(image)
+
+        slot: Optional[int] = None
+        if image.nbytes <= self.slot_bytes:
+            try:
+                slot = self._free_slots.get_nowait()
+            except queue.Empty:
+                pass
+
+        if slot is not None:
+            shm = self._slots[slot]
+            buffer = slot
+        else:
+            shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+            buffer = shm.name
+        np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+
+        task_id = next(self._ids)
+        with self._lock:
+            worker = min(self._workers, key=lambda w: w.in_flight)
+            worker.in_flight += 1
+            self._pending[task_id] = (future, slot, None if slot is not None else shm, worker)
+        worker.send((
+            task_id, buffer, image.shape, image.dtype.str, (confidence_threshold, with_detections, imgsz)
+        ))
+        return future
+
+    def _collect(self):
+        wakeup = self._wakeup[0]
+        while True:
+            workers = list(self._workers)
+            sources = {worker.result_conn: worker for worker in workers}
+            sources.update({worker.process.sentinel: worker for worker in workers})
+            for ready in wait(list(sources) + [wakeup]):
+                if ready is wakeup:
+                    return
+                worker = sources[ready]
+                if ready is worker.result_conn:
+                    try:
+                        self._handle(worker.result_conn.recv())
+                        continue
+                    except (EOFError, OSError):
+                        pass
+                # Result pipe closed or process exited
+                if self._stopping:
+                    return
+                self._replace(worker)
+
+    def _handle(self, message):
+        task_id, result, error = message
+        if task_id == READY_MESSAGE:
+            self.worker_timings.append(result)
+            if error is not None:
+                self.worker_errors.append(error)
+        else:
+            self._finish(task_id, result, error)
+
+    def _finish(self, task_id: int, result, error: Optional[str]):
+        with self._lock:
+            pending = self._pending.pop(task_id, None)
+            if pending is not None:
+                pending[3].in_flight -= 1
+        if pending is None:
+            return
+        future, slot, shm, _ = pending
+
+        if slot is not None:
+            self._free_slots.put(slot)
+        else:
+            shm.close()
+            shm.unlink()
+
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(result)
+
+    def _replace(self, worker: Worker):
+        """Fail the tasks of a dead worker and start a new one in its place"""
+        if self._workers[worker.index] is not worker:
+            return
+        # Results it sent before dying still count
+        while True:
+            try:
+                if not worker.result_conn.poll():
+                    break
+                self._handle(worker.result_conn.recv())
+            except (EOFError, OSError):
+                break
+        worker.process.join(timeout=5)
+        exitcode = worker.process.exitcode
+        with self._lock:
+            lost = [task_id for task_id, pending in self._pending.items() if pending[3] is worker]
+            self._workers[worker.index] = self._spawn(worker.index)
+        print(f"Inference worker {worker.index} died (exit code {exitcode}), "
+              f"failing {len(lost)} tasks and restarting it")
+        for task_id in lost:
+            self._finish(task_id, None, f"Inference worker died (exit code {exitcode})")
+        worker.task_conn.close()
+        worker.result_conn.close()
+        self.restarts += 1
+
+    def stop(self):
+        """Stop workers and release shared memory"""
+        if self._collector is None:
+            return
+        self._stopping = True
+        for worker in self._workers:
+            worker.send(None)
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._wakeup[1].send(None)
+        self._collector.join(timeout=5)
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future, slot, shm, _ in pending.values():
+            future.set_exception(RuntimeError("Inference pool stopped"))
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+
+        self._workers = []
+        self._slots = []
+        self._collector = None
@@ -0,0 +1,65 @@
+"""
+Latency of per-person PPE association on synthetic crowded frames.
+
+    python -m benchmarks.bench_association
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.association import associate_ppe
+
+CLASS_INDEX = {'helmet': 0, 'no-helmet': 1, 'no-vest': 2, 'person': 3, 'vest': 4}
+
+
+def synthetic_frame(persons: int, ppe: int, seed: int = 0):
+    """Person boxes spread over a 4K frame, PPE boxes placed inside random persons"""
+    rng = np.random.default_rng(seed)
+    px = rng.uniform(0, 3800, persons)
+    py = rng.uniform(0, 2000, persons)
+    person_boxes = np.stack([px, py, px + 60, py + 150], axis=1)
+
+    owner = rng.integers(0, persons, ppe)
+    ox = person_boxes[owner, 0] + rng.uniform(0, 30, ppe)
+    oy = person_boxes[owner, 1] + rng.uniform(0, 100, ppe)
+    ppe_boxes = np.stack([ox, oy, ox + 25, oy + 25], axis=1)
+
+    class_ids = np.concatenate([
+        np.full(persons, CLASS_INDEX['person']),
+        rng.choice([0, 1, 2, 4], ppe)
+    ]).astype(np.int64)
+    xyxy = np.concatenate([person_boxes, ppe_boxes]).astype(np.float32)
+    confidences = rng.uniform(0.3, 1.0, persons + ppe).astype(np.float32)
+    return class_ids, confidences, xyxy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    report = []
+    for persons, ppe in [(5, 10), (20, 40), (100, 200), (300, 600)]:
+        class_ids, confidences, xyxy = synthetic_frame(persons, ppe)
+        associate_ppe(class_ids, confidences, xyxy, CLASS_INDEX, 0.3)
+
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            associate_ppe(class_ids, confidences, xyxy, CLASS_INDEX, 0.3)
+            timings.append(time.perf_counter() - start)
+
+        report.append({
+            'persons': persons,
+            'ppe_boxes': ppe,
+            'p50_ms': float(np.percentile(timings, 50)) * 1000,
+            'p95_ms': float(np.percentile(timings, 95)) * 1000,
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
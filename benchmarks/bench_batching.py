@@ -0,0 +1,98 @@
+"""
+Throughput / latency of batched vs unbatched SafetyMonitor inference.
+
+Run from the repository root (needs the model weights):
+
+    python -m benchmarks.bench_batching --concurrency 32 --requests 256
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from app.config import settings
+from app.models import BatchScheduler, safety_monitor
+
+
+def load_frames(image_path: str, count: int, width: int, height: int):
+    """Real image if given, otherwise random noise frames"""
+    if image_path:
+        image = cv2.imread(image_path)
+        if image is None:
+            raise SystemExit(f"Cannot read image: {image_path}")
+        return [image] * count
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def run(call, frames, concurrency):
+    latencies = []
+
+    def one(frame):
+        start = time.perf_counter()
+        call(frame)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, frames))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests': len(frames),
+        'throughput_rps': len(frames) / elapsed,
+        'latency_p50_ms': percentile(latencies, 50),
+        'latency_p95_ms': percentile(latencies, 95),
+        'latency_p99_ms': percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default=None, help='Image to send (random frames by default)')
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--max-batch-size', type=int, default=settings.batch_max_size)
+    parser.add_argument('--max-wait-ms', type=float, default=settings.batch_max_wait_ms)
+    args = parser.parse_args()
+
+    frames = load_frames(args.image, args.requests, args.width, args.height)
+
+    # Warmup so that the first model call does not skew numbers
+    safety_monitor.predict(frames[0])
+
+    # YOLO predictor is not thread-safe, unbatched calls run one at a time
+    model_lock = threading.Lock()
+
+    def unbatched(frame):
+        with model_lock:
+            return safety_monitor.predict(frame)
+
+    scheduler = BatchScheduler(safety_monitor, args.max_batch_size, args.max_wait_ms)
+    report = {
+        'concurrency': args.concurrency,
+        'frame_size': list(frames[0].shape),
+        'max_batch_size': args.max_batch_size,
+        'max_wait_ms': args.max_wait_ms,
+        'unbatched': run(unbatched, frames, args.concurrency),
+        'batched': run(
+            lambda frame: scheduler.submit(frame, settings.confidence_threshold).result(),
+            frames,
+            args.concurrency,
+        ),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
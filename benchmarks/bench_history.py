@@ -0,0 +1,98 @@
+"""
+Write throughput and query latency of the detection history store on
+synthetic frames spread over cameras and days.
+
+    python -m benchmarks.bench_history --frames 2000000 --cameras 20 --days 7
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.history import HistoryStore, SCHEMA
+
+STATUSES = [
+    {'person_detected': True, 'has_helmet': True, 'has_vest': True, 'is_compliant': True,
+     'violations': [], 'persons_count': 2, 'helmets_count': 2, 'vests_count': 2,
+     'no_helmets_count': 0, 'no_vests_count': 0},
+    {'person_detected': True, 'has_helmet': False, 'has_vest': True, 'is_compliant': False,
+     'violations': ['No helmet'], 'persons_count': 1, 'helmets_count': 0, 'vests_count': 1,
+     'no_helmets_count': 1, 'no_vests_count': 0},
+    {'person_detected': True, 'has_helmet': False, 'has_vest': False, 'is_compliant': False,
+     'violations': ['No helmet', 'No vest'], 'persons_count': 3, 'helmets_count': 1, 'vests_count': 1,
+     'no_helmets_count': 2, 'no_vests_count': 2},
+]
+DETECTIONS = [
+    {'class_name': 'person', 'confidence': 0.91, 'bbox': [100.0, 200.0, 180.0, 420.0]},
+    {'class_name': 'helmet', 'confidence': 0.84, 'bbox': [120.0, 200.0, 160.0, 230.0]},
+]
+
+
+def timed(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        'p50_ms': float(np.percentile(timings, 50)) * 1000,
+        'p95_ms': float(np.percentile(timings, 95)) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=1000000)
+    parser.add_argument('--cameras', type=int, default=20)
+    parser.add_argument('--days', type=float, default=7)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='history-bench-')
+    store = HistoryStore(os.path.join(directory, 'history.db'))
+    connection = store._connect()
+    connection.executescript(SCHEMA)
+
+    rng = np.random.default_rng(0)
+    until = time.time()
+    since = until - args.days * 86400
+    timestamps = np.sort(rng.uniform(since, until, args.frames))
+    cameras = rng.integers(0, args.cameras, args.frames)
+    # Mostly compliant frames, like a real site
+    statuses = rng.choice(len(STATUSES), args.frames, p=[0.8, 0.15, 0.05])
+
+    start = time.perf_counter()
+    for offset in range(0, args.frames, args.batch):
+        batch = [
+            (float(timestamps[i]), f'camera-{cameras[i]}', 'bench', False, STATUSES[statuses[i]], DETECTIONS)
+            for i in range(offset, min(offset + args.batch, args.frames))
+        ]
+        store._write(connection, batch)
+    write_seconds = time.perf_counter() - start
+    connection.close()
+
+    queries = {
+        'counts_all_cameras': lambda: store.counts(since, until),
+        'counts_one_camera': lambda: store.counts(since, until, 'camera-7'),
+        'hourly_buckets_all_cameras': lambda: store.buckets(since, until, 3600),
+        'hourly_buckets_one_camera_no_helmet': lambda: store.buckets(since, until, 3600, 'camera-7', 'No helmet'),
+        'daily_buckets_no_vest': lambda: store.buckets(since, until, 86400, violation='No vest'),
+        'last_100_no_helmet_frames_one_camera': lambda: store.frames(since, until, 'camera-7', 'No helmet', 100),
+    }
+    report = {
+        'frames': args.frames,
+        'cameras': args.cameras,
+        'days': args.days,
+        'write_frames_per_second': args.frames / write_seconds,
+        'db_bytes': os.path.getsize(store.path),
+        'queries': {name: timed(query, args.repeat) for name, query in queries.items()}
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
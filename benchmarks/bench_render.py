@@ -0,0 +1,112 @@
+"""
+Latency of drawing detections on frames of different size and crowding:
+legacy renderer (copy + cv2.putText per label) against cached label glyphs,
+in-place drawing and drawing on a downscaled preview.
+
+    python -m benchmarks.bench_render --preview-width 1280
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from app.utils import DETECTION_COLORS, draw_detections
+
+RESOLUTIONS = {'720p': (1280, 720), '1080p': (1920, 1080), '4k': (3840, 2160)}
+SAFETY_STATUS = {
+    'person_detected': True, 'is_compliant': False, 'violations': ['No helmet'],
+    'persons_count': 1, 'helmets_count': 0, 'vests_count': 1,
+}
+
+
+def legacy_draw(image: np.ndarray, detections: list, max_width: int = None) -> np.ndarray:
+    """
+    Renderer before glyph cache: full copy, putText for every label and
+    downscale of the annotated full-size frame at encode time
+    """
+    image_with_boxes = image.copy()
+    for det in detections:
+        color = DETECTION_COLORS.get(det['class_name'], (255, 255, 255))
+        x1, y1, x2, y2 = map(int, det['bbox'])
+        cv2.rectangle(image_with_boxes, (x1, y1), (x2, y2), color, 2)
+        label = f"{det['class_name']}: {det['confidence']:.2f}"
+        cv2.putText(image_with_boxes, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    # status block is unchanged
+    draw_detections(image_with_boxes, [], SAFETY_STATUS, in_place=True)
+
+    if max_width and image_with_boxes.shape[1] > max_width:
+        height = max(1, round(image_with_boxes.shape[0] * max_width / image_with_boxes.shape[1]))
+        image_with_boxes = cv2.resize(image_with_boxes, (max_width, height), interpolation=cv2.INTER_AREA)
+    return image_with_boxes
+
+
+def synthetic_detections(count: int, width: int, height: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    names = list(DETECTION_COLORS)
+    detections = []
+    for _ in range(count):
+        x, y = rng.uniform(0, width - 80), rng.uniform(20, height - 160)
+        detections.append({
+            'class_name': names[rng.integers(len(names))],
+            'confidence': float(rng.uniform(0.3, 1.0)),
+            'bbox': [x, y, x + 60, y + 150],
+        })
+    return detections
+
+
+def timed(fn, repeat: int) -> dict:
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        'p50_ms': float(np.percentile(timings, 50)) * 1000,
+        'p95_ms': float(np.percentile(timings, 95)) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--preview-width', type=int, default=1280)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    report = []
+    for resolution, (width, height) in RESOLUTIONS.items():
+        frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        for count in args.counts:
+            detections = synthetic_detections(count, width, height)
+            # in-place mode draws over the frame, so every run gets a fresh one
+            scratch = frame.copy()
+
+            def in_place():
+                np.copyto(scratch, frame)
+                draw_detections(scratch, detections, SAFETY_STATUS, in_place=True)
+
+            report.append({
+                'resolution': resolution,
+                'detections': count,
+                'legacy': timed(lambda: legacy_draw(frame, detections), args.repeat),
+                'cached_glyphs': timed(lambda: draw_detections(frame, detections, SAFETY_STATUS), args.repeat),
+                # includes the frame refresh, which the server does not pay
+                'in_place': timed(in_place, args.repeat),
+                'legacy_downscaled': timed(
+                    lambda: legacy_draw(frame, detections, args.preview_width), args.repeat
+                ),
+                'preview': timed(
+                    lambda: draw_detections(frame, detections, SAFETY_STATUS, preview_width=args.preview_width),
+                    args.repeat
+                ),
+            })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Response serialization at growing detection counts: the pydantic path
+(DetectionResponse validation, model_dump, Starlette JSON rendering, as
+FastAPI does for response_model) against the fast path in JSON and
+MessagePack, rows and columnar layout.
+
+    python -m benchmarks.bench_serialization
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.schemas import DetectionResponse
+from app.serialization import columnar, dumps, msgpack, orjson
+
+CLASSES = ['helmet', 'no-helmet', 'no-vest', 'person', 'vest']
+
+
+def synthetic_fields(count: int, seed: int = 0) -> dict:
+    """DetectionResponse fields with count detections, as built by the router"""
+    rng = np.random.default_rng(seed)
+    class_ids = rng.integers(0, len(CLASSES), count).tolist()
+    x = rng.uniform(0, 1800, count)
+    y = rng.uniform(0, 900, count)
+    boxes = np.stack([x, y, x + 60, y + 150], axis=1).tolist()
+    detections = [
+        {'class_id': class_id, 'class_name': CLASSES[class_id], 'confidence': confidence, 'bbox': bbox}
+        for class_id, confidence, bbox in zip(class_ids, rng.uniform(0.3, 1.0, count).tolist(), boxes)
+    ]
+    return {
+        'status': 'success',
+        'message': 'Detection completed',
+        'detections': detections,
+        'safety_status': {
+            'person_detected': True, 'has_helmet': True, 'has_vest': False, 'is_compliant': False,
+            'violations': ['No vest'], 'persons_count': count // 5, 'helmets_count': count // 5,
+            'vests_count': 0, 'no_helmets_count': 0, 'no_vests_count': count // 5
+        },
+        'persons': [],
+        'frame_size': {'width': 1920, 'height': 1080},
+        'inference_time': 0.0123,
+        'model_version': 'bench',
+        'reused': None,
+        'overload_level': 0,
+        'queue_depth': 0,
+        'queue_wait_time': 0.0
+    }
+
+
+def pydantic_json(fields: dict) -> bytes:
+    model = DetectionResponse(**fields)
+    return json.dumps(
+        model.model_dump(mode='json'), ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')
+    ).encode()
+
+
+def stdlib_json(fields: dict) -> bytes:
+    return json.dumps(fields, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def with_columnar(fields: dict) -> dict:
+    return {**fields, 'detections': columnar(fields['detections'], CLASSES)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 100, 500, 2000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    encoders = {
+        'pydantic_json': pydantic_json,
+        'fast_rows_stdlib_json': stdlib_json,
+        'fast_rows_json': dumps,
+        'fast_columnar_json': lambda fields: dumps(with_columnar(fields)),
+    }
+    if msgpack is not None:
+        encoders['fast_rows_msgpack'] = msgpack.packb
+        encoders['fast_columnar_msgpack'] = lambda fields: msgpack.packb(with_columnar(fields))
+
+    report = {'orjson': orjson is not None, 'msgpack': msgpack is not None, 'results': []}
+    for count in args.counts:
+        fields = synthetic_fields(count)
+        row = {'detections': count}
+        for name, encode in encoders.items():
+            body = encode(fields)
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                encode(fields)
+                timings.append(time.perf_counter() - start)
+            row[name] = {
+                'p50_ms': float(np.percentile(timings, 50)) * 1000,
+                'bytes': len(body)
+            }
+        baseline = row['pydantic_json']['p50_ms']
+        for name in encoders:
+            row[name]['speedup'] = baseline / row[name]['p50_ms']
+        report['results'].append(row)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Latency versus recall of tiled inference on large site images.
+
+With YOLO labels (class cx cy w h, normalized, one .txt per image) recall
+is measured against ground truth, otherwise against the densest tiling
+setting. Needs the model weights:
+
+    python -m benchmarks.bench_tiling --images path/to/drone/photos --labels path/to/labels \\
+        --tile-sizes 640 960 1280 --overlaps 0.1 0.2 0.3
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from app.association import box_iou
+from app.config import settings
+from app.models import SafetyMonitor
+
+
+def load_dataset(images_folder: str, labels_folder: str, limit: int):
+    paths = sorted(
+        path for path in glob.glob(os.path.join(images_folder, '*'))
+        if os.path.splitext(path)[1].lower() in ('.jpg', '.jpeg', '.png', '.bmp')
+    )[:limit]
+    dataset = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        labels = None
+        if labels_folder:
+            label_path = os.path.join(labels_folder, os.path.splitext(os.path.basename(path))[0] + '.txt')
+            labels = read_labels(label_path, image.shape[1], image.shape[0])
+        dataset.append((image, labels))
+    return dataset
+
+
+def read_labels(path: str, width: int, height: int):
+    """YOLO txt labels as detection dicts in pixels"""
+    labels = []
+    if not os.path.exists(path):
+        return labels
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            class_id = int(parts[0])
+            cx, cy, w, h = (float(value) for value in parts[1:5])
+            labels.append({
+                'class_id': class_id,
+                'bbox': [(cx - w / 2) * width, (cy - h / 2) * height,
+                         (cx + w / 2) * width, (cy + h / 2) * height],
+            })
+    return labels
+
+
+def count_matched(reference, candidate, iou_threshold: float = 0.5) -> int:
+    """Greedy class-aware matching, number of reference boxes found"""
+    matched, used = 0, np.zeros(len(candidate), dtype=bool)
+    if not reference or not candidate:
+        return 0
+    ious = box_iou(
+        np.array([det['bbox'] for det in reference], dtype=np.float32),
+        np.array([det['bbox'] for det in candidate], dtype=np.float32)
+    )
+    candidate_classes = np.array([det['class_id'] for det in candidate])
+    for i, det in enumerate(reference):
+        row = np.where((candidate_classes == det['class_id']) & ~used, ious[i], 0)
+        best = int(row.argmax())
+        if row[best] >= iou_threshold:
+            used[best] = True
+            matched += 1
+    return matched
+
+
+def run_config(monitor: SafetyMonitor, images, tile_size, overlap):
+    """Detections and latencies of one setting, tile_size None = whole frame"""
+    results, timings = [], []
+    for image in images:
+        start = time.perf_counter()
+        if tile_size is None:
+            result = monitor.predict(image)
+        else:
+            settings.tile_size, settings.tile_overlap = tile_size, overlap
+            result = monitor.predict_tiled(image)
+        timings.append(time.perf_counter() - start)
+        results.append(result)
+    return results, timings
+
+
+def score(results, references, small_area: float, images):
+    """Recall overall and for small boxes, precision, against reference detections"""
+    matched = total = candidates = 0
+    small_matched = small_total = 0
+    for result, reference, image in zip(results, references, images):
+        image_area = image.shape[0] * image.shape[1]
+        matched += count_matched(reference, result['detections'])
+        total += len(reference)
+        candidates += len(result['detections'])
+
+        small = [
+            det for det in reference
+            if (det['bbox'][2] - det['bbox'][0]) * (det['bbox'][3] - det['bbox'][1]) < small_area * image_area
+        ]
+        if small:
+            small_matched += count_matched(small, result['detections'])
+            small_total += len(small)
+    return {
+        'recall': matched / total if total else None,
+        'recall_small': small_matched / small_total if small_total else None,
+        'precision': matched / candidates if candidates else None,
+        'reference_boxes': total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True, help='Folder with large site images')
+    parser.add_argument('--labels', default=None, help='Folder with YOLO txt labels')
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--tile-sizes', type=int, nargs='+', default=[640, 960, 1280])
+    parser.add_argument('--overlaps', type=float, nargs='+', default=[0.1, 0.2, 0.3])
+    parser.add_argument('--max-tiles', type=int, default=settings.tile_max)
+    parser.add_argument('--small-area', type=float, default=0.001,
+                        help='Boxes below this share of the image area count as small')
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.images, args.labels, args.limit)
+    if not dataset:
+        raise SystemExit(f"No images in {args.images}")
+    images = [image for image, _ in dataset]
+
+    monitor = SafetyMonitor()
+    monitor.warmup()
+    settings.tile_max = args.max_tiles
+
+    configs = [(None, None)] + [(size, overlap) for size in args.tile_sizes for overlap in args.overlaps]
+    runs = {config: run_config(monitor, images, *config) for config in configs}
+
+    if args.labels:
+        references = [labels for _, labels in dataset]
+        reference_name = 'labels'
+    else:
+        # Densest setting: smallest tiles with the largest overlap
+        densest = (min(args.tile_sizes), max(args.overlaps))
+        references = [
+            [{'class_id': det['class_id'], 'bbox': det['bbox']} for det in result['detections']]
+            for result in runs[densest][0]
+        ]
+        reference_name = f'tile_size={densest[0]} overlap={densest[1]}'
+
+    report = {'images': len(images), 'reference': reference_name, 'results': []}
+    for (tile_size, overlap), (results, timings) in runs.items():
+        report['results'].append({
+            'tile_size': tile_size,
+            'overlap': overlap,
+            'tiles_mean': float(np.mean([result.get('tiles', 1) for result in results])),
+            'latency_p50_ms': float(np.percentile(timings, 50)) * 1000,
+            'latency_p95_ms': float(np.percentile(timings, 95)) * 1000,
+            **score(results, references, args.small_area, images),
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Parity and latency of inference engines against the PyTorch engine.
+
+Export models first (python -m app.engines onnx openvino), then:
+
+    python -m benchmarks.engine_parity --images path/to/site/photos --engines onnx openvino
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from app.association import box_iou
+from app.engines import ENGINES, create_engine
+from app.models import SafetyMonitor
+
+
+def load_images(folder: str, limit: int):
+    if folder:
+        paths = sorted(
+            path for path in glob.glob(os.path.join(folder, '*'))
+            if os.path.splitext(path)[1].lower() in ('.jpg', '.jpeg', '.png', '.bmp')
+        )[:limit]
+        images = [cv2.imread(path) for path in paths]
+        return [image for image in images if image is not None]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(limit)]
+
+
+def monitor_for(engine_name: str) -> SafetyMonitor:
+    monitor = SafetyMonitor(load=False)
+    monitor.engine_name = engine_name
+    monitor.model = create_engine(engine_name).load()
+    return monitor
+
+
+def compare(reference, candidate, iou_threshold: float):
+    """Greedy class-aware matching of candidate detections to reference ones"""
+    matched, ious, confidence_diffs = 0, [], []
+    used = set()
+    for ref in reference:
+        best, best_iou = None, iou_threshold
+        for j, det in enumerate(candidate):
+            if j in used or det['class_id'] != ref['class_id']:
+                continue
+            iou = float(box_iou(np.array([ref['bbox']]), np.array([det['bbox']]))[0, 0])
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            used.add(best)
+            matched += 1
+            ious.append(best_iou)
+            confidence_diffs.append(abs(ref['confidence'] - candidate[best]['confidence']))
+    return matched, ious, confidence_diffs
+
+
+def measure(monitor: SafetyMonitor, images, warmup: int = 3):
+    for image in images[:warmup]:
+        monitor.predict(image)
+    results, timings = [], []
+    for image in images:
+        start = time.perf_counter()
+        results.append(monitor.predict(image))
+        timings.append(time.perf_counter() - start)
+    return results, {
+        'latency_p50_ms': float(np.percentile(timings, 50)) * 1000,
+        'latency_p95_ms': float(np.percentile(timings, 95)) * 1000,
+        'latency_mean_ms': float(np.mean(timings)) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default=None, help='Folder with test images (random frames by default)')
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--engines', nargs='+', default=['onnx', 'openvino'], choices=list(ENGINES))
+    parser.add_argument('--iou', type=float, default=0.9, help='IoU for a detection to count as the same box')
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    reference, torch_latency = measure(monitor_for('torch'), images)
+    report = {'images': len(images), 'torch': torch_latency}
+
+    reference_total = sum(len(result['detections']) for result in reference)
+    for engine_name in args.engines:
+        try:
+            results, latency = measure(monitor_for(engine_name), images)
+        except Exception as e:
+            report[engine_name] = {'error': str(e)}
+            continue
+
+        matched, ious, confidence_diffs, same_status = 0, [], [], 0
+        candidate_total = 0
+        for ref, result in zip(reference, results):
+            m, i, c = compare(ref['detections'], result['detections'], args.iou)
+            matched += m
+            ious += i
+            confidence_diffs += c
+            candidate_total += len(result['detections'])
+            same_status += ref['safety_status'] == result['safety_status']
+
+        report[engine_name] = {
+            **latency,
+            'speedup_vs_torch': torch_latency['latency_mean_ms'] / latency['latency_mean_ms'],
+            'recall_vs_torch': matched / reference_total if reference_total else 1.0,
+            'precision_vs_torch': matched / candidate_total if candidate_total else 1.0,
+            'mean_iou': float(np.mean(ious)) if ious else None,
+            'max_confidence_diff': float(np.max(confidence_diffs)) if confidence_diffs else None,
+            'safety_status_agreement': same_status / len(images) if images else 1.0,
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
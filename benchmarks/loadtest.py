@@ -0,0 +1,312 @@
+"""
+In-process load test of the API with the stub engine: synthetic images of
+several resolutions, every endpoint at fixed concurrency levels, JSON report
+of throughput and latency percentiles. Needs no server and no weights;
+the client is httpx, installed with requirements.txt.
+
+    python -m benchmarks.loadtest --output before.json
+    # ... change code ...
+    python -m benchmarks.loadtest --output after.json --compare before.json
+
+Client and server share one process and event loop, so absolute numbers are
+below a real deployment; compare reports made on the same machine with the
+same flags. Rows are keyed by endpoint, resolution and concurrency.
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+RESOLUTIONS = {
+    '480p': (640, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+PREFIX = '/api/v1/detection'
+
+
+def synthetic_image(width: int, height: int, variant: int) -> bytes:
+    """Deterministic JPEG with smooth background and shapes (noise would inflate file size)"""
+    rng = np.random.default_rng([variant, width, height])
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[..., 0] = x * 0.6 + y * 0.4
+    image[..., 1] = 255 - x * 0.5
+    image[..., 2] = y * 0.8
+    for _ in range(40):
+        x1, y1 = int(rng.integers(0, width)), int(rng.integers(0, height))
+        x2 = x1 + int(rng.integers(10, max(11, width // 8)))
+        y2 = y1 + int(rng.integers(10, max(11, height // 4)))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, -1)
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buffer.tobytes()
+
+
+def upload(data: bytes, field: str = 'image'):
+    return {field: ('frame.jpg', data, 'image/jpeg')}
+
+
+def make_endpoints(batch_images: int):
+    """Endpoint name -> coroutine function (client, image bytes) -> response"""
+    return {
+        'detect': lambda client, data: client.post(f'{PREFIX}/detect', files=upload(data)),
+        'detect-annotated': lambda client, data: client.post(
+            f'{PREFIX}/detect', files=upload(data), params={'return_image': 'true'}
+        ),
+        'detect-image': lambda client, data: client.post(f'{PREFIX}/detect-image', files=upload(data)),
+        'detect-base64': lambda client, data: client.post(
+            f'{PREFIX}/detect-base64', json={'image_base64': base64.b64encode(data).decode()}
+        ),
+        'detect-batch': lambda client, data: client.post(
+            f'{PREFIX}/detect-batch', files=[('images', ('frame.jpg', data, 'image/jpeg'))] * batch_images
+        ),
+        'detect-and-save': lambda client, data: client.post(f'{PREFIX}/detect-and-save', files=upload(data)),
+    }
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Run app startup / shutdown handlers, ASGITransport does not"""
+    receive_queue, send_queue = asyncio.Queue(), asyncio.Queue()
+    task = asyncio.create_task(app(
+        {'type': 'lifespan', 'asgi': {'version': '3.0'}, 'state': {}},
+        receive_queue.get, send_queue.put
+    ))
+    await receive_queue.put({'type': 'lifespan.startup'})
+    message = await send_queue.get()
+    if message['type'] != 'lifespan.startup.complete':
+        raise RuntimeError(f"App startup failed: {message.get('message')}")
+    try:
+        yield
+    finally:
+        await receive_queue.put({'type': 'lifespan.shutdown'})
+        await send_queue.get()
+        await task
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {'latency_p50_ms': None, 'latency_p95_ms': None, 'latency_p99_ms': None,
+                'latency_mean_ms': None, 'latency_max_ms': None}
+    values = np.array(latencies) * 1000
+    return {
+        'latency_p50_ms': float(np.percentile(values, 50)),
+        'latency_p95_ms': float(np.percentile(values, 95)),
+        'latency_p99_ms': float(np.percentile(values, 99)),
+        'latency_mean_ms': float(values.mean()),
+        'latency_max_ms': float(values.max()),
+    }
+
+
+async def run_cell(client, call, images, concurrency: int, requests: int):
+    """Closed loop: concurrency clients send requests back to back"""
+    latencies, statuses = [], Counter()
+    counter = itertools.count()
+
+    async def client_loop():
+        while True:
+            index = next(counter)
+            if index >= requests:
+                return
+            start_time = time.perf_counter()
+            response = await call(client, images[index % len(images)])
+            elapsed = time.perf_counter() - start_time
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                latencies.append(elapsed)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[client_loop() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        'requests': requests,
+        'ok': statuses.get(200, 0),
+        'rejected': statuses.get(429, 0),
+        'errors': requests - statuses.get(200, 0) - statuses.get(429, 0),
+        'duration_s': elapsed,
+        'throughput_rps': statuses.get(200, 0) / elapsed,
+        **percentiles(latencies),
+    }
+
+
+async def run_all(args):
+    import httpx
+    from app.main import app
+
+    endpoints = make_endpoints(args.batch_images)
+    images = {
+        name: [synthetic_image(*RESOLUTIONS[name], variant) for variant in range(args.variants)]
+        for name in args.resolutions
+    }
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url='http://loadtest', timeout=None) as client:
+        # Model loads in background on startup
+        while (await client.get(f'{PREFIX}/ready')).status_code != 200:
+            await asyncio.sleep(0.05)
+
+        for endpoint in args.endpoints:
+            for resolution in args.resolutions:
+                for concurrency in args.concurrency:
+                    await run_cell(client, endpoints[endpoint], images[resolution],
+                                   concurrency, args.warmup)
+                    row = await run_cell(client, endpoints[endpoint], images[resolution],
+                                         concurrency, args.requests)
+                    width, height = RESOLUTIONS[resolution]
+                    results.append({
+                        'endpoint': endpoint,
+                        'resolution': resolution,
+                        'width': width,
+                        'height': height,
+                        'image_bytes': int(np.mean([len(data) for data in images[resolution]])),
+                        'concurrency': concurrency,
+                        'images_per_request': args.batch_images if endpoint == 'detect-batch' else 1,
+                        **row,
+                    })
+                    print(f"{endpoint:>17} {resolution:>5} c={concurrency:<3} "
+                          f"{row['throughput_rps']:8.1f} rps  p50 {row['latency_p50_ms'] or 0:8.1f} ms  "
+                          f"p95 {row['latency_p95_ms'] or 0:8.1f} ms  errors {row['errors']} "
+                          f"rejected {row['rejected']}", file=sys.stderr)
+    return results
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                         stderr=subprocess.DEVNULL).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], stderr=subprocess.DEVNULL) != 0
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def row_key(row):
+    return row['endpoint'], row['resolution'], row['concurrency']
+
+
+def compare(baseline, results, threshold: float):
+    """Relative change per row, regression if throughput or p95 is worse than threshold"""
+    previous = {row_key(row): row for row in baseline['results']}
+    comparison = []
+    for row in results:
+        old = previous.get(row_key(row))
+        if old is None or not old['throughput_rps'] or not old['latency_p95_ms'] or not row['latency_p95_ms']:
+            continue
+        throughput_change = row['throughput_rps'] / old['throughput_rps'] - 1
+        p95_change = row['latency_p95_ms'] / old['latency_p95_ms'] - 1
+        comparison.append({
+            'endpoint': row['endpoint'],
+            'resolution': row['resolution'],
+            'concurrency': row['concurrency'],
+            'throughput_change': throughput_change,
+            'latency_p95_change': p95_change,
+            'regression': throughput_change < -threshold or p95_change > threshold,
+        })
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', nargs='+', default=list(make_endpoints(1)), choices=list(make_endpoints(1)))
+    parser.add_argument('--resolutions', nargs='+', default=['480p', '1080p', '4k'], choices=list(RESOLUTIONS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=64, help='Timed requests per cell')
+    parser.add_argument('--warmup', type=int, default=4, help='Untimed requests before every cell')
+    parser.add_argument('--variants', type=int, default=8, help='Distinct images per resolution')
+    parser.add_argument('--batch-images', type=int, default=4, help='Images per /detect-batch request')
+    parser.add_argument('--stub-latency-ms', type=float, default=20.0)
+    parser.add_argument('--stub-per-image-ms', type=float, default=5.0)
+    parser.add_argument('--stub-boxes', type=int, default=12)
+    parser.add_argument('--inference-workers', type=int, default=0)
+    parser.add_argument('--cache', action='store_true', help='Keep the result cache on (off by default)')
+    # Both keep state from one cell to the next (gate: last result per
+    # camera, overload: current level), so rows depend on the cell order
+    parser.add_argument('--gate', action='store_true', help='Keep the scene change gate on (off by default)')
+    parser.add_argument('--overload', action='store_true',
+                        help='Keep overload degradation on (off by default)')
+    parser.add_argument('--history', action='store_true', help='Record detection history (off by default)')
+    parser.add_argument('--output', default=None, help='Report file (stdout by default)')
+    parser.add_argument('--compare', default=None, help='Earlier report to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative change counted as regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    # Settings are read when app is imported; spawned inference workers
+    # inherit the environment too. Features are pinned, not taken from the
+    # environment, and everything written goes to a temporary directory
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    os.environ.update({
+        'INFERENCE_ENGINE': 'stub',
+        'ALLOW_STUB_ENGINE': 'true',
+        'STUB_LATENCY_MS': str(args.stub_latency_ms),
+        'STUB_PER_IMAGE_MS': str(args.stub_per_image_ms),
+        'STUB_BOXES': str(args.stub_boxes),
+        'INFERENCE_WORKERS': str(args.inference_workers),
+        'CACHE_ENABLED': str(args.cache).lower(),
+        'GATE_ENABLED': str(args.gate).lower(),
+        'OVERLOAD_ENABLED': str(args.overload).lower(),
+        'HISTORY_ENABLED': str(args.history).lower(),
+        'HISTORY_DB': os.path.join(workdir, 'history.db'),
+        'STORAGE_DIR': os.path.join(workdir, 'results'),
+        'VIDEO_UPLOAD_DIR': os.path.join(workdir, 'uploads'),
+        'ROI_FILE': os.path.join(workdir, 'roi.json'),
+    })
+
+    results = asyncio.run(run_all(args))
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'args': {key: value for key, value in vars(args).items()
+                     if key not in ('output', 'compare', 'fail_on_regression')},
+        },
+        'results': results,
+    }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report['baseline_commit'] = baseline['meta'].get('commit')
+        report['comparison'] = compare(baseline, results, args.threshold)
+        regressions = [row for row in report['comparison'] if row['regression']]
+        for row in report['comparison']:
+            print(f"{row['endpoint']:>17} {row['resolution']:>5} c={row['concurrency']:<3} "
+                  f"throughput {row['throughput_change']:+7.1%}  p95 {row['latency_p95_change']:+7.1%}"
+                  f"{'  REGRESSION' if row['regression'] else ''}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()